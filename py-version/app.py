@@ -15,7 +15,7 @@ import pandas as pd
 from typing import Dict, List, Any
 
 # Import our custom modules
-from src.tokenization import BPETokenizer, create_sample_tokenizer
+from src.tokenization import BPETokenizer, TokenizationColumns, create_sample_tokenizer
 from src.embeddings import create_sample_embedding_layer
 from src.attention import create_sample_attention_layer, AttentionVisualizer
 from src.feedforward import create_sample_feedforward_layer
@@ -117,15 +117,15 @@ def process_text_with_llm(text: str, vocab_size: int, d_model: int, num_heads: i
     with st.spinner("🔄 Processing text through LLM pipeline..."):
         try:
             # Step 1: Tokenization
-            tokenizer = create_sample_tokenizer()
+            tokenizer = create_sample_tokenizer(verbose=False)
             tokens_info = tokenizer.visualize_tokenization(text)
             
             if show_all_steps:
                 display_tokenization_step(tokens_info, detailed_explanations)
             
             # Step 2: Embeddings
-            token_ids = torch.tensor([[token['token_id'] for token in tokens_info]])
-            token_texts = [token['token_text'] for token in tokens_info]
+            token_ids = torch.as_tensor(tokens_info.token_ids, dtype=torch.long).unsqueeze(0)
+            token_texts = tokens_info.token_texts
             
             embedding_layer = create_sample_embedding_layer(vocab_size, d_model)
             embedding_viz = embedding_layer.visualize_embeddings(token_ids, token_texts)
@@ -167,7 +167,7 @@ def process_text_with_llm(text: str, vocab_size: int, d_model: int, num_heads: i
             st.info("Try adjusting the model parameters or using simpler text.")
 
 
-def display_tokenization_step(tokens_info: List[Dict], detailed: bool):
+def display_tokenization_step(tokens_info: TokenizationColumns, detailed: bool):
     """Display tokenization step results."""
     st.header("🔤 Step 1: Tokenization")
     
@@ -178,7 +178,7 @@ def display_tokenization_step(tokens_info: List[Dict], detailed: bool):
         """)
     
     # Create tokenization visualization
-    df = pd.DataFrame(tokens_info)
+    df = pd.DataFrame(tokens_info.to_dict())
     
     col1, col2 = st.columns(2)
     
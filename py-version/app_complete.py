@@ -261,7 +261,8 @@ def process_step_1_tokenization(text_input, config):
     """, unsafe_allow_html=True)
     
     # Create tokenizer and process text
-    tokenizer = create_dynamic_tokenizer(text_input, vocab_size=config['vocab_size'])
+    tokenizer = create_dynamic_tokenizer(text_input, vocab_size=config['vocab_size'],
+                                         incremental=True, verbose=False)
     tokens = tokenizer.encode(text_input)
     tokens_info = tokenizer.visualize_tokenization(text_input)
     
@@ -0,0 +1,407 @@
+"""
+Tokenizer throughput benchmark for the educational LLM project.
+
+This script times training, encoding (single, cached, batch and array
+paths) and decoding across vocabulary and corpus sizes, and the
+pre-tokenizer on a large input, and writes the results to a JSON file.
+A saved result file can be used as a baseline: throughput drops beyond
+a threshold are reported as regressions.
+
+Usage:
+    python benchmark_tokenizer.py --output results.json
+    python benchmark_tokenizer.py --quick --baseline results.json --threshold 0.1
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import itertools
+import argparse
+import platform
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.tokenization import BPETokenizer, PreTokenizer
+
+
+# Throughput metrics compared against a baseline (higher is better)
+THROUGHPUT_METRICS = ('tokens_per_sec', 'merges_per_sec', 'chars_per_sec')
+
+DEFAULT_VOCAB_SIZES = [1000, 4000, 8000, 16000, 32000]
+DEFAULT_CORPUS_CHARS = [100_000, 1_000_000]
+DEFAULT_PRE_TOKENIZER_CHARS = 10_000_000
+
+
+def generate_corpus(num_chars: int, seed: int = 0) -> str:
+    """
+    Generate a synthetic corpus with a Zipf-like word distribution.
+
+    A repeated sample text has too few distinct words to learn large
+    vocabularies, so words are drawn from a random lexicon instead.
+
+    Args:
+        num_chars: Approximate corpus size in characters
+        seed: Random seed (the corpus is deterministic for a given seed)
+
+    Returns:
+        Corpus text, one sentence per line
+    """
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    lexicon = [''.join(rng.choice(letters) for _ in range(rng.randint(2, 10)))
+               for _ in range(50_000)]
+    # Cumulative weights, computed once (choices would redo it on every call)
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(lexicon) + 1)))
+
+    lines = []
+    size = 0
+    while size < num_chars:
+        words = rng.choices(lexicon, cum_weights=cum_weights, k=rng.randint(5, 20))
+        line = ' '.join(words).capitalize() + '.'
+        lines.append(line)
+        size += len(line) + 1
+
+    return '\n'.join(lines)
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """
+    Get the peak resident set size of this process (or its finished children).
+
+    Note that this is a high-water mark for the whole run: benchmark a
+    single configuration to get its own peak.
+
+    Returns:
+        Peak RSS in megabytes, or None where the resource module is missing
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+
+
+def _best_time(function, repeats: int) -> float:
+    """Run a function several times and return the fastest wall time."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _peak_traced_mb(function) -> float:
+    """Run a function once and return the peak memory it allocated (in MB)."""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / (1 << 20)
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_pre_tokenizer(corpus: str, repeats: int = 3) -> Dict:
+    """
+    Compare word counting with a PreTokenizer against the naive approach.
+
+    The naive version lowercases a copy of the whole text and builds the
+    full word list with an uncompiled pattern; the pre-tokenizer counts
+    chunk by chunk and folds only the distinct words. Both count the same
+    words. Times are measured without tracing; memory is the tracemalloc
+    peak of a separate run, i.e. Python allocations only.
+
+    Args:
+        corpus: Text to count the words of
+        repeats: Number of timed runs per version (best time is kept)
+
+    Returns:
+        Dictionary with time, throughput and peak memory of both versions
+    """
+    pre_tokenizer = PreTokenizer(r'\b\w+\b', case='lower')
+
+    versions = {
+        'naive': lambda: Counter(re.findall(r'\b\w+\b', corpus.lower())),
+        'pre_tokenizer': lambda: pre_tokenizer.count_words(corpus)
+    }
+
+    result = {'corpus_chars': len(corpus)}
+    for name, function in versions.items():
+        seconds = _best_time(function, repeats)
+        result[name] = {
+            'seconds': seconds,
+            'chars_per_sec': len(corpus) / seconds,
+            'peak_mb': _peak_traced_mb(function)
+        }
+
+    result['speedup'] = result['naive']['seconds'] / result['pre_tokenizer']['seconds']
+    result['memory_ratio'] = result['naive']['peak_mb'] / result['pre_tokenizer']['peak_mb']
+
+    return result
+
+
+def benchmark_configuration(corpus: str, vocab_size: int, num_workers: int = 2,
+                            repeats: int = 3) -> Dict:
+    """
+    Benchmark every tokenizer stage for one vocabulary size and corpus.
+
+    Args:
+        corpus: Training and encoding text (one document per line)
+        vocab_size: Target vocabulary size
+        num_workers: Number of processes for the batch encoding path
+        repeats: Number of runs per encode/decode stage (best time is kept)
+
+    Returns:
+        Dictionary with timings and throughput per stage
+    """
+    lines = [line for line in corpus.split('\n') if line]
+    tokenizer = BPETokenizer(vocab_size=vocab_size, verbose=False)
+
+    start = time.perf_counter()
+    tokenizer.train(corpus)
+    train_seconds = time.perf_counter() - start
+    num_merges = len(tokenizer.merges)
+    training_stats = tokenizer.training_stats
+
+    def encode_cold():
+        tokenizer.clear_cache()
+        return [tokenizer.encode(line) for line in lines]
+
+    encoded = encode_cold()
+    num_tokens = sum(len(token_ids) for token_ids in encoded)
+    max_len = max(len(token_ids) for token_ids in encoded)
+
+    timings = {
+        'encode': _best_time(encode_cold, repeats),
+        'encode_cached': _best_time(lambda: [tokenizer.encode(line) for line in lines], repeats),
+        'encode_batch': _best_time(lambda: tokenizer.encode_batch(lines, num_workers=num_workers),
+                                   repeats),
+        'encode_to_array': _best_time(lambda: tokenizer.encode_to_array(lines, max_len), repeats),
+        'decode': _best_time(lambda: [tokenizer.decode(token_ids) for token_ids in encoded],
+                             repeats)
+    }
+
+    result = {
+        'vocab_size': vocab_size,
+        'corpus_chars': len(corpus),
+        'num_documents': len(lines),
+        'num_tokens': num_tokens,
+        'train': {
+            'seconds': train_seconds,
+            'merges': num_merges,
+            'merges_per_sec': num_merges / train_seconds,
+            'chars_per_sec': len(corpus) / train_seconds,
+            'counting_seconds': training_stats['counting_sec'],
+            'selection_seconds': training_stats['selection_sec'],
+            'merging_seconds': training_stats['merging_sec'],
+            'mean_words_touched': training_stats['mean_words_touched']
+        }
+    }
+
+    for stage, seconds in timings.items():
+        result[stage] = {
+            'seconds': seconds,
+            'tokens_per_sec': num_tokens / seconds
+        }
+
+    result['peak_rss_mb'] = peak_rss_mb()
+    result['peak_rss_children_mb'] = peak_rss_mb(children=True)
+
+    return result
+
+
+def run_benchmarks(vocab_sizes: List[int], corpus_sizes: List[int],
+                   corpus_text: Optional[str] = None, num_workers: int = 2,
+                   repeats: int = 3, pre_tokenizer_chars: int = 0) -> Dict:
+    """
+    Benchmark all combinations of vocabulary and corpus sizes.
+
+    Args:
+        vocab_sizes: Vocabulary sizes to train
+        corpus_sizes: Corpus sizes in characters
+        corpus_text: Real text to use (truncated to each size) instead of
+            the synthetic corpus
+        num_workers: Number of processes for the batch encoding path
+        repeats: Number of runs per encode/decode stage
+        pre_tokenizer_chars: Corpus size for the pre-tokenizer benchmark
+            (0 to skip it)
+
+    Returns:
+        Dictionary with run metadata, one result per configuration and the
+        pre-tokenizer result
+    """
+    results = []
+    for corpus_chars in corpus_sizes:
+        if corpus_text is not None:
+            corpus = corpus_text[:corpus_chars]
+        else:
+            corpus = generate_corpus(corpus_chars)
+
+        for vocab_size in vocab_sizes:
+            print(f"⏱️ vocab_size={vocab_size}, corpus_chars={len(corpus)}")
+            result = benchmark_configuration(corpus, vocab_size, num_workers, repeats)
+            print(f"   train: {result['train']['merges_per_sec']:.0f} merges/sec, "
+                  f"encode: {result['encode']['tokens_per_sec']:.0f} tokens/sec, "
+                  f"decode: {result['decode']['tokens_per_sec']:.0f} tokens/sec")
+            results.append(result)
+
+    pre_tokenizer = None
+    if pre_tokenizer_chars:
+        if corpus_text is not None:
+            corpus = corpus_text[:pre_tokenizer_chars]
+        else:
+            corpus = generate_corpus(pre_tokenizer_chars)
+
+        print(f"⏱️ pre-tokenizer, corpus_chars={len(corpus)}")
+        pre_tokenizer = benchmark_pre_tokenizer(corpus, repeats)
+        print(f"   naive: {pre_tokenizer['naive']['seconds']:.2f}s, "
+              f"{pre_tokenizer['naive']['peak_mb']:.1f}MB; "
+              f"pre-tokenizer: {pre_tokenizer['pre_tokenizer']['seconds']:.2f}s, "
+              f"{pre_tokenizer['pre_tokenizer']['peak_mb']:.1f}MB "
+              f"({pre_tokenizer['speedup']:.2f}x speed, "
+              f"{pre_tokenizer['memory_ratio']:.1f}x less memory)")
+
+    return {
+        'metadata': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'num_workers': num_workers,
+            'repeats': repeats,
+            'synthetic_corpus': corpus_text is None
+        },
+        'results': results,
+        'pre_tokenizer': pre_tokenizer
+    }
+
+
+def compare_results(current: Dict, baseline: Dict, threshold: float = 0.1) -> List[Dict]:
+    """
+    Find throughput regressions against a baseline run.
+
+    Configurations are matched on (vocab_size, corpus_chars); a metric
+    regresses when it drops by more than threshold (relative).
+
+    Args:
+        current: Result of run_benchmarks
+        baseline: Saved result of an earlier run
+        threshold: Allowed relative slowdown, e.g. 0.1 for 10%
+
+    Returns:
+        List of regressions (empty if none)
+    """
+    baseline_results = {
+        (result['vocab_size'], result['corpus_chars']): result
+        for result in baseline['results']
+    }
+
+    regressions = []
+
+    # The pre-tokenizer result is compared when both runs used the same size
+    current_pre, baseline_pre = current.get('pre_tokenizer'), baseline.get('pre_tokenizer')
+    if current_pre and baseline_pre and current_pre['corpus_chars'] == baseline_pre['corpus_chars']:
+        change = (current_pre['pre_tokenizer']['chars_per_sec']
+                  / baseline_pre['pre_tokenizer']['chars_per_sec'] - 1)
+        if change < -threshold:
+            regressions.append({
+                'vocab_size': None,
+                'corpus_chars': current_pre['corpus_chars'],
+                'stage': 'pre_tokenizer',
+                'metric': 'chars_per_sec',
+                'baseline': baseline_pre['pre_tokenizer']['chars_per_sec'],
+                'current': current_pre['pre_tokenizer']['chars_per_sec'],
+                'change': change
+            })
+
+    for result in current['results']:
+        reference = baseline_results.get((result['vocab_size'], result['corpus_chars']))
+        if reference is None:
+            continue
+
+        for stage, metrics in result.items():
+            if not isinstance(metrics, dict) or not isinstance(reference.get(stage), dict):
+                continue
+            for metric in THROUGHPUT_METRICS:
+                if metric not in metrics or not reference[stage].get(metric):
+                    continue
+                change = metrics[metric] / reference[stage][metric] - 1
+                if change < -threshold:
+                    regressions.append({
+                        'vocab_size': result['vocab_size'],
+                        'corpus_chars': result['corpus_chars'],
+                        'stage': stage,
+                        'metric': metric,
+                        'baseline': reference[stage][metric],
+                        'current': metrics[metric],
+                        'change': change
+                    })
+
+    return regressions
+
+
+def main():
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description="Benchmark BPE tokenizer throughput")
+    parser.add_argument('--vocab-sizes', type=int, nargs='+', default=DEFAULT_VOCAB_SIZES)
+    parser.add_argument('--corpus-chars', type=int, nargs='+', default=DEFAULT_CORPUS_CHARS)
+    parser.add_argument('--corpus', help="Text file to use instead of the synthetic corpus")
+    parser.add_argument('--num-workers', type=int, default=2)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--quick', action='store_true',
+                        help="Small run: vocab sizes 1000/4000 on a 50k-char corpus "
+                             "(pre-tokenizer on 1M chars)")
+    parser.add_argument('--pre-tokenizer-chars', type=int, default=DEFAULT_PRE_TOKENIZER_CHARS,
+                        help="Corpus size of the pre-tokenizer benchmark (0 to skip)")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help="Result file of an earlier run to compare against")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Allowed relative throughput drop (default 0.1)")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.vocab_sizes, args.corpus_chars = [1000, 4000], [50_000]
+        args.pre_tokenizer_chars = min(args.pre_tokenizer_chars, 1_000_000)
+
+    corpus_text = None
+    if args.corpus:
+        with open(args.corpus, 'r', encoding='utf-8') as f:
+            corpus_text = f.read()
+
+    print("🚀 Tokenizer Benchmark")
+    print("=" * 50)
+
+    current = run_benchmarks(args.vocab_sizes, args.corpus_chars, corpus_text,
+                             args.num_workers, args.repeats, args.pre_tokenizer_chars)
+
+    with open(args.output, 'w') as f:
+        json.dump(current, f, indent=2)
+    print(f"💾 Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        regressions = compare_results(current, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"   vocab={regression['vocab_size']} corpus={regression['corpus_chars']} "
+                      f"{regression['stage']}.{regression['metric']}: "
+                      f"{regression['baseline']:.0f} -> {regression['current']:.0f} "
+                      f"({regression['change']:+.1%})")
+            sys.exit(1)
+
+        print(f"✅ No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Load generator for the tokenizer server.
+
+This script opens several concurrent clients against a tokenizer server,
+sends encode (and optionally decode) requests as fast as the server
+answers them, and reports the p50/p99 request latency, throughput and the
+server's own batching metrics. Without --address it starts a server in
+the same process.
+
+Usage:
+    python load_test_tokenizer.py --clients 32 --requests 200
+    python -m src.tokenizer_server --socket /tmp/bpe.sock &
+    python load_test_tokenizer.py --address unix:/tmp/bpe.sock
+"""
+
+import time
+import asyncio
+import argparse
+import numpy as np
+from typing import Dict, List, Optional
+
+from src.tokenization import SAMPLE_TRAINING_TEXT, create_sample_tokenizer
+from src.tokenizer_server import TokenizerServer, TokenizerClient
+
+
+async def _run_client(address: str, texts: List[str], num_requests: int,
+                      decode: bool, latencies: List[float]) -> None:
+    """Send requests one after another and record each latency."""
+    client = TokenizerClient()
+    await client.connect(address)
+    try:
+        for i in range(num_requests):
+            text = texts[i % len(texts)]
+            start = time.perf_counter()
+            token_ids = await client.encode(text)
+            latencies.append(time.perf_counter() - start)
+
+            if decode:
+                start = time.perf_counter()
+                await client.decode(token_ids)
+                latencies.append(time.perf_counter() - start)
+    finally:
+        await client.close()
+
+
+async def run_load_test(address: Optional[str] = None, num_clients: int = 16,
+                        requests_per_client: int = 100, decode: bool = False,
+                        max_batch_size: int = 64, max_latency_ms: float = 5.0) -> Dict:
+    """
+    Measure request latency under concurrent load.
+
+    Args:
+        address: Server address ('unix:<path>' or 'host:port'); if None, a
+            server with the sample tokenizer is started in this process
+        num_clients: Number of concurrent client connections
+        requests_per_client: Number of encode requests per client
+        decode: Also decode every encoded result
+        max_batch_size: Batch size of the in-process server
+        max_latency_ms: Batching deadline of the in-process server
+
+    Returns:
+        Dictionary with latency percentiles, throughput and server metrics
+    """
+    server = None
+    if address is None:
+        server = TokenizerServer(create_sample_tokenizer(), max_batch_size, max_latency_ms)
+        address = await server.start()
+
+    texts = [line for line in SAMPLE_TRAINING_TEXT.split('\n') if line.strip()]
+    latencies = []
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            _run_client(address, texts[i:] + texts[:i], requests_per_client, decode, latencies)
+            for i in range(num_clients)
+        ])
+        elapsed = time.perf_counter() - start
+
+        client = TokenizerClient()
+        await client.connect(address)
+        server_metrics = await client.metrics()
+        await client.close()
+    finally:
+        if server is not None:
+            await server.close()
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'address': address,
+        'num_clients': num_clients,
+        'num_requests': len(latencies),
+        'elapsed_sec': elapsed,
+        'requests_per_sec': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies_ms, 50)),
+        'p99_ms': float(np.percentile(latencies_ms, 99)),
+        'max_ms': float(latencies_ms.max()),
+        'server': server_metrics
+    }
+
+
+def main():
+    """Run the load test from the command line."""
+    parser = argparse.ArgumentParser(description="Load test the tokenizer server")
+    parser.add_argument('--address', help="Server address, 'unix:<path>' or 'host:port' "
+                                          "(starts an in-process server if omitted)")
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=100, help="Requests per client")
+    parser.add_argument('--decode', action='store_true', help="Also decode every result")
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--max-latency-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    print("🚀 Tokenizer Server Load Test")
+    print("=" * 50)
+
+    result = asyncio.run(run_load_test(args.address, args.clients, args.requests, args.decode,
+                                       args.max_batch_size, args.max_latency_ms))
+
+    server = result['server']
+    print(f"📡 {result['address']}: {result['num_clients']} clients, "
+          f"{result['num_requests']} requests in {result['elapsed_sec']:.2f}s")
+    print(f"   Throughput: {result['requests_per_sec']:.0f} requests/sec")
+    print(f"   Latency: p50={result['p50_ms']:.2f}ms, p99={result['p99_ms']:.2f}ms, "
+          f"max={result['max_ms']:.2f}ms")
+    print(f"   Server: {server['batches_total']} batches, "
+          f"mean batch size {server['mean_batch_size']:.1f}, "
+          f"max queue depth {server['max_queue_depth']}")
+
+
+if __name__ == "__main__":
+    main()
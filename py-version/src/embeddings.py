@@ -9,7 +9,7 @@ import torch
 import torch.nn as nn
 import numpy as np
 import math
-from typing import Tuple, Dict, List
+from typing import Tuple, Dict, List, Optional
 
 
 class TokenEmbedding(nn.Module):
@@ -108,16 +108,22 @@ class PositionalEncoding(nn.Module):
         # Register as buffer (not a parameter, but part of the module)
         self.register_buffer('pe', pe.unsqueeze(0))
     
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(self, x: torch.Tensor, position_ids: Optional[torch.Tensor] = None) -> torch.Tensor:
         """
         Add positional encoding to input embeddings.
         
         Args:
             x: Input embeddings of shape (batch_size, seq_len, d_model)
+            position_ids: Optional positions of shape (batch_size, seq_len),
+                e.g. restarting at 0 for every document in a packed row
             
         Returns:
             Embeddings with positional encoding added
         """
+        if position_ids is not None:
+            # Look up the encoding of each token's own position
+            return x + self.pe[0, position_ids]
+        
         seq_len = x.size(1)
         
         # Add positional encoding (up to the sequence length)
@@ -165,12 +171,13 @@ class CombinedEmbedding(nn.Module):
         self.d_model = d_model
         self.vocab_size = vocab_size
     
-    def forward(self, token_ids: torch.Tensor) -> torch.Tensor:
+    def forward(self, token_ids: torch.Tensor, position_ids: Optional[torch.Tensor] = None) -> torch.Tensor:
         """
         Convert token IDs to final input embeddings.
         
         Args:
             token_ids: Token IDs tensor of shape (batch_size, seq_len)
+            position_ids: Optional positions of shape (batch_size, seq_len)
             
         Returns:
             Final embeddings of shape (batch_size, seq_len, d_model)
@@ -179,7 +186,7 @@ class CombinedEmbedding(nn.Module):
         token_embeds = self.token_embedding(token_ids)
         
         # Step 2: Add positional encoding
-        embeddings = self.positional_encoding(token_embeds)
+        embeddings = self.positional_encoding(token_embeds, position_ids)
         
         # Step 3: Apply dropout for regularization
         embeddings = self.dropout(embeddings)
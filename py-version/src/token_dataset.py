@@ -0,0 +1,359 @@
+"""
+Token dataset module for educational LLM project.
+
+This module turns a text corpus into memory-mapped shards of token IDs
+and serves fixed-length training windows for GPTTransformer, showing how
+training data is prepared at scale without loading it into memory.
+"""
+
+import os
+import json
+import bisect
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+from typing import Dict, List, Optional, Sequence, Tuple, Iterator
+
+from .tokenization import BPETokenizer
+
+
+# Name of the index file written next to the shards
+INDEX_FILENAME = 'index.json'
+_DATASET_FORMAT_VERSION = 1
+
+
+def _iter_documents(corpus_paths: List[str], encoding: str = 'utf-8') -> Iterator[str]:
+    """
+    Stream the documents of a corpus: every non-empty line is one document.
+
+    Args:
+        corpus_paths: Paths of the corpus text files
+        encoding: Text encoding of the files
+
+    Yields:
+        Document texts (without the trailing newline)
+    """
+    for path in corpus_paths:
+        with open(path, 'r', encoding=encoding) as f:
+            for line in f:
+                line = line.rstrip('\n')
+                if line.strip():
+                    yield line
+
+
+def build_token_dataset(corpus_paths: List[str],
+                        tokenizer: BPETokenizer,
+                        out_dir: str,
+                        shard_size: int = 1 << 24,
+                        num_workers: Optional[int] = None,
+                        chunk_size: int = 1000) -> Dict:
+    """
+    Tokenize a corpus into binary shards of token IDs.
+
+    Documents are encoded in parallel (BPETokenizer.iter_encode_batch), each
+    as <BOS> ... <EOS>, and their token IDs are appended to one long stream
+    that is cut into shards of shard_size tokens. Token IDs are stored as
+    uint16 when the vocabulary fits, uint32 otherwise. An index file
+    describes the shards.
+
+    Args:
+        corpus_paths: Paths of the corpus text files (one document per line)
+        tokenizer: Trained tokenizer
+        out_dir: Output directory for the shards and the index
+        shard_size: Number of tokens per shard
+        num_workers: Number of encoding processes (defaults to the CPU count)
+        chunk_size: Number of documents sent to a worker per task
+
+    Returns:
+        The index dictionary (also saved as out_dir/index.json)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    # 2 bytes per token are enough for vocabularies up to 65536 tokens
+    dtype = np.uint16 if max(tokenizer.vocab) < 2 ** 16 else np.uint32
+
+    buffer = np.empty(shard_size, dtype=dtype)
+    filled = 0
+    shards = []
+    num_documents = 0
+
+    def write_shard(num_tokens: int) -> None:
+        filename = f"shard_{len(shards):05d}.bin"
+        buffer[:num_tokens].tofile(os.path.join(out_dir, filename))
+        shards.append({'file': filename, 'num_tokens': num_tokens})
+
+    documents = _iter_documents(corpus_paths)
+    for token_ids in tokenizer.iter_encode_batch(documents, num_workers=num_workers,
+                                                 chunk_size=chunk_size):
+        num_documents += 1
+        position = 0
+
+        # A document may continue into the next shard
+        while position < len(token_ids):
+            count = min(shard_size - filled, len(token_ids) - position)
+            buffer[filled:filled + count] = token_ids[position:position + count]
+            filled += count
+            position += count
+
+            if filled == shard_size:
+                write_shard(filled)
+                filled = 0
+
+    if filled:
+        write_shard(filled)
+
+    index = {
+        'format_version': _DATASET_FORMAT_VERSION,
+        'dtype': np.dtype(dtype).name,
+        'vocab_size': max(tokenizer.vocab) + 1,
+        'num_documents': num_documents,
+        'total_tokens': sum(shard['num_tokens'] for shard in shards),
+        'shards': shards
+    }
+
+    with open(os.path.join(out_dir, INDEX_FILENAME), 'w') as f:
+        json.dump(index, f, indent=2)
+
+    return index
+
+
+class TokenWindowDataset(Dataset):
+    """
+    Fixed-length training windows over memory-mapped token shards.
+
+    Item i is a pair (input_ids, target_ids) of length seq_len, where the
+    targets are the inputs shifted by one token (next-token prediction).
+    Shards are memory-mapped, so data is only read when a window is used;
+    windows never cross shard boundaries.
+
+    Each window is copied out of the shard as int64 (seq_len + 1 tokens),
+    and both tensors are views of that copy: torch only supports
+    uint16/uint32 tensors from 2.3 on, and GPTTransformer wants long IDs.
+    """
+
+    def __init__(self, data_dir: str, seq_len: int, stride: Optional[int] = None):
+        """
+        Open a dataset written by build_token_dataset.
+
+        Args:
+            data_dir: Directory with the shards and the index file
+            seq_len: Number of tokens per training window
+            stride: Distance between window starts (defaults to seq_len,
+                i.e. non-overlapping windows)
+        """
+        self.data_dir = data_dir
+        self.seq_len = seq_len
+        self.stride = stride or seq_len
+
+        with open(os.path.join(data_dir, INDEX_FILENAME)) as f:
+            self.index = json.load(f)
+
+        self._open_shards()
+
+        # cumulative_windows[k] = number of windows in shards 0..k
+        window_size = seq_len + 1
+        self.cumulative_windows = []
+        total_windows = 0
+        for shard in self.index['shards']:
+            num_tokens = shard['num_tokens']
+            if num_tokens >= window_size:
+                total_windows += (num_tokens - window_size) // self.stride + 1
+            self.cumulative_windows.append(total_windows)
+
+    def _open_shards(self) -> None:
+        """Memory-map every shard (read-only)."""
+        self.shards = [
+            np.memmap(os.path.join(self.data_dir, shard['file']),
+                      dtype=self.index['dtype'], mode='r', shape=(shard['num_tokens'],))
+            for shard in self.index['shards']
+        ]
+
+    def __getstate__(self) -> Dict:
+        """Pickle without the mappings (e.g. for DataLoader workers)."""
+        state = self.__dict__.copy()
+        state['shards'] = None
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        """Re-open the mappings in the new process."""
+        self.__dict__.update(state)
+        self._open_shards()
+
+    def __len__(self) -> int:
+        return self.cumulative_windows[-1] if self.cumulative_windows else 0
+
+    def __getitem__(self, idx: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Get a training window.
+
+        Args:
+            idx: Window index
+
+        Returns:
+            Tuple (input_ids, target_ids) of int64 tensors, each of shape (seq_len,)
+        """
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f"Window index {idx} out of range for {len(self)} windows")
+
+        # Find the shard holding this window
+        shard_idx = bisect.bisect_right(self.cumulative_windows, idx)
+        first_window = self.cumulative_windows[shard_idx - 1] if shard_idx > 0 else 0
+        start = (idx - first_window) * self.stride
+
+        window = self.shards[shard_idx][start:start + self.seq_len + 1]
+        window = torch.from_numpy(window.astype(np.int64))
+
+        return window[:-1], window[1:]
+
+    def get_dataset_info(self) -> Dict:
+        """
+        Get information about the dataset.
+
+        Returns:
+            Dictionary with dataset statistics
+        """
+        return {
+            'num_shards': len(self.shards),
+            'num_documents': self.index['num_documents'],
+            'total_tokens': self.index['total_tokens'],
+            'dtype': self.index['dtype'],
+            'seq_len': self.seq_len,
+            'stride': self.stride,
+            'num_windows': len(self)
+        }
+
+
+class PackingCollator:
+    """
+    Pack variable-length sequences into fixed-length rows.
+
+    Instead of padding every sequence to the longest one in the batch,
+    sequences (each ending in <EOS>) are placed side by side in rows of
+    max_seq_len tokens (first-fit decreasing). To keep the documents
+    isolated, the batch carries a causal block-diagonal attention mask
+    (GPTTransformer applies no causal mask of its own), position ids that
+    restart at 0 for every document, and labels that never cross a
+    document boundary. Use it as a DataLoader collate_fn.
+    """
+
+    def __init__(self, tokenizer: BPETokenizer, max_seq_len: int):
+        """
+        Initialize the collator.
+
+        Args:
+            tokenizer: Tokenizer providing the <EOS> and <PAD> IDs
+            max_seq_len: Length of the packed rows
+        """
+        self.max_seq_len = max_seq_len
+        self.eos_id = tokenizer.special_tokens['<EOS>']
+        self.pad_id = tokenizer.special_tokens['<PAD>']
+
+        # Running totals for get_packing_stats()
+        self.total_tokens = 0
+        self.padded_slots = 0
+        self.packed_slots = 0
+
+    def _split_sequences(self, sequences: Sequence[Sequence[int]]) -> Tuple[List[List[int]], List[int]]:
+        """Terminate every sequence with <EOS> and cut it into row-sized segments."""
+        segments = []
+        lengths = []
+        for sequence in sequences:
+            token_ids = [int(token_id) for token_id in sequence]
+            if not token_ids or token_ids[-1] != self.eos_id:
+                token_ids.append(self.eos_id)
+            lengths.append(len(token_ids))
+
+            for start in range(0, len(token_ids), self.max_seq_len):
+                segments.append(token_ids[start:start + self.max_seq_len])
+
+        return segments, lengths
+
+    def _pack(self, segments: List[List[int]]) -> List[List[List[int]]]:
+        """Assign segments to rows with the first-fit decreasing heuristic."""
+        rows = []
+        free_space = []
+        for segment in sorted(segments, key=len, reverse=True):
+            for row_idx, space in enumerate(free_space):
+                if len(segment) <= space:
+                    rows[row_idx].append(segment)
+                    free_space[row_idx] -= len(segment)
+                    break
+            else:
+                rows.append([segment])
+                free_space.append(self.max_seq_len - len(segment))
+
+        return rows
+
+    def __call__(self, sequences: Sequence[Sequence[int]]) -> Dict:
+        """
+        Pack a batch of encoded sequences.
+
+        Args:
+            sequences: Token ID sequences (lists or 1-D tensors)
+
+        Returns:
+            Dictionary with input_ids, labels (-100 where no prediction is
+            made), position_ids, segment_ids (0 for padding) of shape
+            (num_rows, max_seq_len), a causal attention_mask of shape
+            (num_rows, max_seq_len, max_seq_len), and the padding ratios of
+            this batch before and after packing
+        """
+        segments, lengths = self._split_sequences(sequences)
+        rows = self._pack(segments)
+
+        num_rows = len(rows)
+        input_ids = torch.full((num_rows, self.max_seq_len), self.pad_id, dtype=torch.long)
+        labels = torch.full((num_rows, self.max_seq_len), -100, dtype=torch.long)
+        position_ids = torch.zeros((num_rows, self.max_seq_len), dtype=torch.long)
+        segment_ids = torch.zeros((num_rows, self.max_seq_len), dtype=torch.long)
+
+        for row_idx, row in enumerate(rows):
+            start = 0
+            for segment_number, segment in enumerate(row, start=1):
+                end = start + len(segment)
+                segment_tensor = torch.tensor(segment, dtype=torch.long)
+                input_ids[row_idx, start:end] = segment_tensor
+                labels[row_idx, start:end - 1] = segment_tensor[1:]
+                position_ids[row_idx, start:end] = torch.arange(len(segment))
+                segment_ids[row_idx, start:end] = segment_number
+                start = end
+
+        # Tokens attend only to earlier positions of their own segment
+        # (padding only to padding), so no token sees the one it predicts
+        same_segment = segment_ids.unsqueeze(2) == segment_ids.unsqueeze(1)
+        causal = torch.tril(torch.ones(self.max_seq_len, self.max_seq_len, dtype=torch.bool))
+        attention_mask = same_segment & causal
+
+        # Padding needed without packing: every sequence padded to the longest
+        num_tokens = sum(lengths)
+        padded_slots = len(lengths) * max(lengths, default=0)
+        packed_slots = num_rows * self.max_seq_len
+
+        self.total_tokens += num_tokens
+        self.padded_slots += padded_slots
+        self.packed_slots += packed_slots
+
+        return {
+            'input_ids': input_ids,
+            'labels': labels,
+            'position_ids': position_ids,
+            'segment_ids': segment_ids,
+            'attention_mask': attention_mask,
+            'padding_ratio_before': 1 - num_tokens / padded_slots if padded_slots else 0.0,
+            'padding_ratio_after': 1 - num_tokens / packed_slots if packed_slots else 0.0
+        }
+
+    def get_packing_stats(self) -> Dict:
+        """
+        Get the padding ratios over all batches collated so far.
+
+        Returns:
+            Dictionary with token counts and padding ratios
+        """
+        return {
+            'total_tokens': self.total_tokens,
+            'padding_ratio_before': 1 - self.total_tokens / self.padded_slots if self.padded_slots else 0.0,
+            'padding_ratio_after': 1 - self.total_tokens / self.packed_slots if self.packed_slots else 0.0
+        }
@@ -5,10 +5,27 @@ This module implements BPE (Byte Pair Encoding) tokenization from scratch
 for educational purposes, showing how text is converted to tokens.
 """
 
+import os
 import re
-from typing import List, Dict, Tuple, Optional
+import sys
+import mmap as _mmap
+import heapq
+import struct
+import hashlib
+import time
+import threading
+import copy
+import bisect
+import operator
+import tempfile
+from array import array
+from itertools import islice
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator, Callable, Union
 import json
-from collections import defaultdict, Counter
+import numpy as np
+from collections import defaultdict, Counter, OrderedDict, deque
+from collections.abc import Sequence, Mapping
+from concurrent.futures import ProcessPoolExecutor
 
 
 class BPETokenizer:
@@ -19,18 +36,57 @@ class BPETokenizer:
     the BPE algorithm step by step.
     """
     
-    def __init__(self, vocab_size: int = 1000):
+    def __init__(self, vocab_size: int = 1000, cache_size: int = 10000,
+                 min_pair_frequency: int = 1, verbose: bool = True,
+                 pre_tokenizer: Optional['PreTokenizer'] = None):
         """
         Initialize the BPE tokenizer.
         
         Args:
             vocab_size: Maximum vocabulary size to build
+            cache_size: Maximum number of words kept in the encoding cache
+                (0 disables caching)
+            min_pair_frequency: Training stops before vocab_size is reached
+                once the most frequent pair occurs fewer times than this
+            verbose: Print training progress (False for silent library use;
+                use a progress callback to observe training instead)
+            pre_tokenizer: How text is split into words for training and
+                encoding (defaults to the lossless PreTokenizer(); saved
+                with the tokenizer)
         """
         self.vocab_size = vocab_size
+        self.min_pair_frequency = min_pair_frequency
+        self.verbose = verbose
+        self.pre_tokenizer = pre_tokenizer if pre_tokenizer is not None else PreTokenizer()
+        self.training_stats = None  # summary of the last training run (the 'done' event)
+        
+        # Token strings are "byte strings": one character per UTF-8 byte
+        # (chr(byte)), so any text can be represented without <UNK>.
+        # ASCII tokens look exactly like the text they stand for.
         self.vocab = {}  # token_id -> token_string
         self.token_to_id = {}  # token_string -> token_id
         self.merges = []  # List of merge operations
         
+        # Integer form of self.merges used by the encoder. For the merge at
+        # position (rank) r: merge_left_ids[r] + merge_right_ids[r] -> merge_new_ids[r].
+        # merge_pair_ranks maps the packed pair key (left_id << 32 | right_id)
+        # to r, so encoding never has to build or compare strings.
+        self.merge_pair_ranks = {}
+        self.merge_left_ids = array('i')
+        self.merge_right_ids = array('i')
+        self.merge_new_ids = array('i')
+        self._mapped_buffer = None  # file mapping backing the arrays after load(mmap=True)
+        self._trie = None  # vocabulary trie for mode='longest_match', built on first use
+        self._token_tables = None  # per-ID display texts and type codes, built on first use
+        self._decode_tables = None  # per-ID bytes and skip mask for decode, built on first use
+        
+        # LRU cache of word -> token IDs. Real text is Zipfian, so a small
+        # cache answers most words ("the", "and", ...) without running BPE.
+        self.cache_size = cache_size
+        self._word_cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
         # Special tokens
         self.special_tokens = {
             '<BOS>': 0,  # Beginning of sequence
@@ -39,326 +95,2545 @@ class BPETokenizer:
             '<UNK>': 3   # Unknown token
         }
         
-        # Initialize vocabulary with special tokens
+        # Initialize vocabulary with special tokens and the 256 byte tokens
         self._init_special_tokens()
     
+    def __getstate__(self) -> Dict:
+        """Pickle the tokenizer without its word cache (e.g. for worker processes)."""
+        state = self.__dict__.copy()
+        state['_word_cache'] = OrderedDict()
+        
+        # Views into a memory-mapped file cannot be pickled; send copies
+        state['_mapped_buffer'] = None
+        state['_trie'] = None
+        state['_token_tables'] = None
+        state['_decode_tables'] = None
+        for name in ('merge_left_ids', 'merge_right_ids', 'merge_new_ids'):
+            state[name] = array('i', state[name])
+        
+        # Read-only views into a shared buffer (see attach_shared)
+        state['vocab'] = dict(state['vocab'])
+        state['token_to_id'] = dict(state['token_to_id'])
+        state['merges'] = list(state['merges'])
+        
+        return state
+    
+    def _detach_shared_tables(self) -> None:
+        """Replace read-only shared views by private tables before modifying them."""
+        if not isinstance(self.vocab, dict):
+            self.vocab = dict(self.vocab)
+            self.token_to_id = dict(self.token_to_id)
+            self.merges = list(self.merges)
+    
     def _init_special_tokens(self):
-        """Initialize vocabulary with special tokens."""
+        """Initialize vocabulary with special tokens and the byte alphabet."""
+        self.vocab = {}
+        self.token_to_id = {}
+        self.merges = []
+        
         for token, token_id in self.special_tokens.items():
             self.vocab[token_id] = token
             self.token_to_id[token] = token_id
+        
+        # One token per byte value, right after the special tokens. Every
+        # word is a sequence of these before any merge is applied.
+        self.byte_offset = len(self.special_tokens)
+        for byte in range(256):
+            self.vocab[self.byte_offset + byte] = chr(byte)
+            self.token_to_id[chr(byte)] = self.byte_offset + byte
+    
+    def _log(self, message: str) -> None:
+        """Print a progress message unless the tokenizer is silent."""
+        if self.verbose:
+            print(message)
     
     def _get_word_frequencies(self, text: str) -> Dict[str, int]:
         """
         Count word frequencies in text.
         
+        "Words" are the pieces produced by self.pre_tokenizer (by default
+        runs of letters/digits or punctuation with their leading space, and
+        runs of whitespace).
+        
         Args:
             text: Input text to analyze
             
         Returns:
             Dictionary mapping words to their frequencies
         """
-        # Simple word tokenization (split on whitespace and punctuation)
-        words = re.findall(r'\b\w+\b', text.lower())
-        return Counter(words)
+        return self.pre_tokenizer.count_words(text)
     
-    def _get_pair_frequencies(self, word_freqs: Dict[str, int]) -> Dict[Tuple[str, str], int]:
+    def _get_pair_frequencies(self, word_freqs: Dict[Tuple[str, ...], int]) -> Dict[Tuple[str, str], int]:
         """
-        Count frequencies of character pairs in words.
+        Count frequencies of adjacent symbol pairs in words.
+        
+        This is the straightforward reference version of the counting step:
+        it rescans every word. Training uses BPETrainer, which keeps these
+        counts up to date incrementally and produces the same merges.
         
         Args:
-            word_freqs: Dictionary of word frequencies
+            word_freqs: Dictionary mapping symbol sequences to frequencies
             
         Returns:
-            Dictionary mapping character pairs to frequencies
+            Dictionary mapping symbol pairs to frequencies
         """
         pairs = defaultdict(int)
         
-        for word, freq in word_freqs.items():
-            # Split word into characters
-            chars = list(word)
-            
+        for symbols, freq in word_freqs.items():
             # Count adjacent pairs
-            for i in range(len(chars) - 1):
-                pair = (chars[i], chars[i + 1])
+            for i in range(len(symbols) - 1):
+                pair = (symbols[i], symbols[i + 1])
                 pairs[pair] += freq
         
         return pairs
     
-    def _merge_vocab(self, pair: Tuple[str, str], word_freqs: Dict[str, int]) -> Dict[str, int]:
+    def _merge_vocab(self, pair: Tuple[str, str],
+                     word_freqs: Dict[Tuple[str, ...], int]) -> Dict[Tuple[str, ...], int]:
         """
         Merge the most frequent pair in the vocabulary.
         
         Args:
             pair: The pair to merge
-            word_freqs: Current word frequencies
+            word_freqs: Current symbol sequences and their frequencies
             
         Returns:
             Updated word frequencies with merged pair
         """
-        new_word_freqs = {}
+        return {
+            tuple(merge_symbol_pair(list(symbols), pair)): freq
+            for symbols, freq in word_freqs.items()
+        }
+    
+    def _count_words_parallel(self, count_function, tasks: List, num_workers: int) -> Counter:
+        """
+        Count words in several pieces of a corpus with a process pool.
         
-        # Pattern to match the pair
-        pattern = re.escape(pair[0]) + re.escape(pair[1])
-        replacement = pair[0] + pair[1]
+        Partial counts are reduced in corpus order, so the merged Counter
+        has the same first-occurrence order (and therefore the same merge
+        tie-breaking) as counting the whole corpus serially.
         
-        for word, freq in word_freqs.items():
-            # Replace the pair in the word
-            new_word = re.sub(pattern, replacement, word)
-            new_word_freqs[new_word] = freq
+        Args:
+            count_function: Worker function mapping a task to a Counter
+            tasks: One task per piece of the corpus, in corpus order
+            num_workers: Number of worker processes
+            
+        Returns:
+            Combined word frequencies
+        """
+        word_freqs = Counter()
         
-        return new_word_freqs
+        with ProcessPoolExecutor(max_workers=num_workers,
+                                 initializer=_init_encode_worker,
+                                 initargs=(self,)) as executor:
+            for partial_counts in executor.map(count_function, tasks):
+                word_freqs.update(partial_counts)
+        
+        return word_freqs
     
-    def train(self, text: str) -> None:
+    def train(self, text: str, num_workers: int = 1,
+              progress_callback: Optional[Callable[[Dict], None]] = None) -> None:
         """
         Train the BPE tokenizer on the given text.
         
         Args:
             text: Training text
+            num_workers: Number of processes used to count words (the text
+                is split at line boundaries between them)
+            progress_callback: Called with every training event, see
+                _learn_vocabulary
         """
-        print("🚀 Training BPE tokenizer...")
+        self._log("🚀 Training BPE tokenizer...")
+        start = time.perf_counter()
         
         # Step 1: Get word frequencies
+        if num_workers > 1:
+            pieces = [text[start:end] for start, end in
+                      split_at_line_boundaries(text, num_workers * 4)]
+            word_freqs = self._count_words_parallel(_count_text, pieces, num_workers)
+        else:
+            word_freqs = self._get_word_frequencies(text)
+        
+        self._learn_vocabulary(word_freqs, counting_sec=time.perf_counter() - start,
+                               progress_callback=progress_callback)
+    
+    def train_from_iterator(self, texts: Iterable[str],
+                            progress_callback: Optional[Callable[[Dict], None]] = None) -> None:
+        """
+        Train the BPE tokenizer on a stream of texts.
+        
+        Word counts are merged piece by piece, so only the counts of unique
+        words are kept in memory, never the raw corpus. Each item is
+        pre-tokenized on its own, so items should end between words.
+        
+        Args:
+            texts: Iterable of training texts, e.g. the lines of a file
+            progress_callback: Called with every training event, see
+                _learn_vocabulary
+        """
+        self._log("🚀 Training BPE tokenizer (streaming)...")
+        start = time.perf_counter()
+        
+        # Step 1: Get word frequencies, one piece of text at a time
+        word_freqs = Counter()
+        for text in texts:
+            word_freqs.update(self._get_word_frequencies(text))
+        
+        self._learn_vocabulary(word_freqs, counting_sec=time.perf_counter() - start,
+                               progress_callback=progress_callback)
+    
+    def train_from_files(self, paths: List[str], chunk_chars: int = 1 << 20,
+                         encoding: str = 'utf-8', num_workers: int = 1,
+                         progress_callback: Optional[Callable[[Dict], None]] = None) -> None:
+        """
+        Train the BPE tokenizer on text files, reading them in chunks.
+        
+        Args:
+            paths: Paths of the training files
+            chunk_chars: Number of characters read at a time
+            encoding: Text encoding of the files
+            num_workers: Number of processes used to count words; each one
+                counts a byte range of a file, aligned to line boundaries
+                (requires UTF-8 files)
+            progress_callback: Called with every training event, see
+                _learn_vocabulary
+        """
+        if num_workers > 1:
+            self._log("🚀 Training BPE tokenizer (parallel counting)...")
+            start = time.perf_counter()
+            
+            tasks = [
+                (path, range_start, range_end, encoding)
+                for path in paths
+                for range_start, range_end in line_aligned_byte_ranges(path, num_workers * 4)
+            ]
+            word_freqs = self._count_words_parallel(_count_file_range, tasks, num_workers)
+            self._learn_vocabulary(word_freqs, counting_sec=time.perf_counter() - start,
+                                   progress_callback=progress_callback)
+            return
+        
+        self.train_from_iterator(
+            (chunk
+             for path in paths
+             for chunk in read_text_chunks(path, chunk_chars, encoding)),
+            progress_callback=progress_callback
+        )
+    
+    def adapt(self, text: str,
+              progress_callback: Optional[Callable[[Dict], None]] = None) -> None:
+        """
+        Learn extra merges from new text on top of the existing ones.
+        
+        Words of the new text are first segmented with the merges the
+        tokenizer already has; BPE then continues from that segmentation
+        until vocab_size is reached. New tokens get IDs after the existing
+        vocabulary, so existing token IDs do not change, and
+        only the word counts of the new text are processed, which is much
+        cheaper than retraining on base text plus new text.
+        
+        Args:
+            text: Text to adapt the tokenizer to
+            progress_callback: Called with every training event, see
+                _learn_vocabulary
+        """
+        self._log("🚀 Adapting BPE tokenizer...")
+        start = time.perf_counter()
+        self._detach_shared_tables()
+        
         word_freqs = self._get_word_frequencies(text)
-        print(f"📊 Found {len(word_freqs)} unique words")
         
-        # Step 2: Initialize vocabulary with individual characters
-        vocab_size = len(self.special_tokens)
+        # Start from the current segmentation of every word
+        word_symbols = {
+            word: [self.vocab[token_id] for token_id in self._encode_word(word)]
+            for word in word_freqs
+        }
+        
+        self._learn_vocabulary(word_freqs, word_symbols=word_symbols,
+                               counting_sec=time.perf_counter() - start,
+                               progress_callback=progress_callback)
+    
+    def count_tokens(self, texts: Iterable[str]) -> Counter:
+        """
+        Count how often every token ID is used when encoding texts.
+        
+        Args:
+            texts: Iterable of texts (e.g. a representative corpus)
+            
+        Returns:
+            Counter mapping token IDs to usage counts, for prune()
+        """
+        counts = Counter()
+        for text in texts:
+            counts.update(self.encode(text))
+        return counts
+    
+    def prune(self, corpus_counts: Dict[int, int], target_size: int) -> Dict[int, int]:
+        """
+        Drop rarely used merged tokens and renumber the IDs compactly.
+        
+        No retraining is needed: removing the merges that produce a token
+        keeps BPE valid as long as no remaining merge uses that token, so
+        tokens are dropped from the leaves of the merge graph upwards,
+        least used first. When a token is dropped its text is covered by
+        the two tokens it was merged from, so its count moves to them.
+        Special tokens and the 256 byte tokens are always kept, so every
+        text can still be encoded and decode(encode(text)) is unchanged.
+        
+        Args:
+            corpus_counts: Token ID -> usage count (see count_tokens)
+            target_size: Number of tokens to keep
+            
+        Returns:
+            Old ID -> new ID for every kept token, in ascending order of
+            both; see remap_embeddings to shrink an embedding matrix
+        """
+        self._detach_shared_tables()
+        
+        num_base = self.byte_offset + 256
+        if target_size < num_base:
+            raise ValueError(f"target_size must be at least {num_base} "
+                             f"(special tokens and byte tokens)")
+        
+        # Merge graph: which merges produce each token, and how many merges use it
+        producers = defaultdict(list)
+        num_uses = Counter()
+        for left, right in self.merges:
+            left_id, right_id = self.token_to_id[left], self.token_to_id[right]
+            producers[self.token_to_id[left + right]].append((left_id, right_id))
+            num_uses[left_id] += 1
+            num_uses[right_id] += 1
+        
+        counts = {token_id: corpus_counts.get(token_id, 0) for token_id in self.vocab}
+        
+        # Min-heap of removable tokens: least used first, newest first on ties
+        heap = [(counts[token_id], -token_id) for token_id in self.vocab
+                if token_id >= num_base and num_uses[token_id] == 0]
+        heapq.heapify(heap)
+        
+        removed = set()
+        num_to_remove = len(self.vocab) - target_size
+        while len(removed) < num_to_remove and heap:
+            count, neg_id = heapq.heappop(heap)
+            token_id = -neg_id
+            
+            # Outdated entry: the count grew since it was pushed
+            if token_id in removed or count != counts[token_id]:
+                continue
+            
+            removed.add(token_id)
+            for left_id, right_id in producers[token_id]:
+                for part_id in (left_id, right_id):
+                    num_uses[part_id] -= 1
+                counts[left_id] += counts[token_id]
+                counts[right_id] += counts[token_id]
+                for part_id in {left_id, right_id}:
+                    if part_id >= num_base and num_uses[part_id] == 0:
+                        heapq.heappush(heap, (counts[part_id], -part_id))
+        
+        # Kept tokens keep their order; base tokens keep their IDs
+        remap = {}
+        for old_id in sorted(self.vocab):
+            if old_id not in removed:
+                remap[old_id] = len(remap)
+        
+        removed_tokens = {self.vocab[token_id] for token_id in removed}
+        self.merges = [(left, right) for left, right in self.merges
+                       if left + right not in removed_tokens]
+        self.vocab = {remap[old_id]: self.vocab[old_id] for old_id in remap}
+        self.token_to_id = {token: token_id for token_id, token in self.vocab.items()}
+        self.vocab_size = len(self.vocab)
+        
+        # Cached encodings use the old IDs
+        self._build_merge_tables()
+        self.clear_cache()
+        
+        self._log(f"✂️ Pruned {len(removed)} tokens, vocabulary size: {len(self.vocab)}")
+        
+        return remap
+    
+    def _learn_vocabulary(self, word_freqs: Dict[str, int],
+                          word_symbols: Optional[Dict[str, List[str]]] = None,
+                          counting_sec: float = 0.0,
+                          progress_callback: Optional[Callable[[Dict], None]] = None) -> None:
+        """
+        Build the vocabulary and merges from word frequencies.
+        
+        Training reports its progress as events (dictionaries) to
+        progress_callback, with time split between counting (words, then
+        the trainer's initial pair counts), selection (best_pair) and
+        merging:
         
-        # Add all characters to vocabulary
-        all_chars = set()
-        for word in word_freqs:
-            all_chars.update(word)
+            'counted'  unique_words, counting_sec
+            'merge'    iteration, vocab_size, pair, pair_frequency,
+                       words_touched, merges_per_sec, elapsed_sec,
+                       counting_sec, selection_sec, merging_sec
+            'done'     num_merges, vocab_size, merges_per_sec, mean words
+                       touched per merge, and the same timings
         
-        for char in sorted(all_chars):
-            if char not in self.token_to_id:
-                self.vocab[vocab_size] = char
-                self.token_to_id[char] = vocab_size
-                vocab_size += 1
+        The 'done' event is also kept as self.training_stats.
+        
+        Args:
+            word_freqs: Dictionary mapping words to frequencies
+            word_symbols: Optional initial segmentation of each word into
+                existing tokens. Without it, training starts from scratch
+                and every word starts as its UTF-8 bytes.
+            counting_sec: Time the caller spent counting words
+            progress_callback: Called with every training event
+            
+        Raises:
+            ValueError: If vocab_size leaves no room for merges
+        """
+        num_base = self.byte_offset + 256
+        if self.vocab_size <= num_base:
+            raise ValueError(f"vocab_size must be greater than {num_base} (special tokens "
+                             f"and byte tokens) to learn any merges, got {self.vocab_size}")
+        
+        self._log(f"📊 Found {len(word_freqs)} unique words")
+        
+        # Step 2: Start from the byte alphabet (or the current vocabulary)
+        if word_symbols is None:
+            self._init_special_tokens()
+        else:
+            word_symbols = {to_byte_string(word): symbols for word, symbols in word_symbols.items()}
+        word_freqs = {to_byte_string(word): freq for word, freq in word_freqs.items()}
+        vocab_size = max(self.vocab) + 1
         
         # Step 3: Perform BPE merges
+        # The trainer keeps pair counts up to date, so each merge only
+        # touches the words that actually contain the merged pair.
+        start = time.perf_counter()
+        trainer = BPETrainer(word_freqs, word_symbols)
+        counting_sec += time.perf_counter() - start
+        
+        if progress_callback is not None:
+            progress_callback({'event': 'counted', 'unique_words': len(word_freqs),
+                               'counting_sec': counting_sec})
+        
+        merge_start = time.perf_counter()
+        selection_sec = 0.0
+        merging_sec = 0.0
+        words_touched_total = 0
         iteration = 0
         while vocab_size < self.vocab_size:
-            # Get pair frequencies
-            pair_freqs = self._get_pair_frequencies(word_freqs)
+            # Find most frequent pair
+            start = time.perf_counter()
+            best_pair = trainer.best_pair()
+            selection_sec += time.perf_counter() - start
             
-            if not pair_freqs:
+            if best_pair is None:
                 break
             
-            # Find most frequent pair
-            best_pair = max(pair_freqs, key=pair_freqs.get)
+            # Rarer merges would only bloat the merge list
+            pair_frequency = trainer.pair_counts[best_pair]
+            if pair_frequency < self.min_pair_frequency:
+                break
             
             # Merge the pair
-            word_freqs = self._merge_vocab(best_pair, word_freqs)
+            start = time.perf_counter()
+            words_touched = trainer.merge(best_pair)
             
             # Add merged token to vocabulary
             merged_token = best_pair[0] + best_pair[1]
             self.vocab[vocab_size] = merged_token
             self.token_to_id[merged_token] = vocab_size
             self.merges.append(best_pair)
+            merging_sec += time.perf_counter() - start
             
             vocab_size += 1
             iteration += 1
+            words_touched_total += words_touched
+            
+            if progress_callback is not None:
+                elapsed = time.perf_counter() - merge_start
+                progress_callback({
+                    'event': 'merge',
+                    'iteration': iteration,
+                    'vocab_size': vocab_size,
+                    'pair': best_pair,
+                    'pair_frequency': pair_frequency,
+                    'words_touched': words_touched,
+                    'merges_per_sec': iteration / elapsed if elapsed else 0.0,
+                    'elapsed_sec': elapsed,
+                    'counting_sec': counting_sec,
+                    'selection_sec': selection_sec,
+                    'merging_sec': merging_sec
+                })
             
-            if iteration % 50 == 0:
+            if self.verbose and iteration % 50 == 0:
                 print(f"✅ Completed {iteration} merges, vocab size: {vocab_size}")
         
-        print(f"🎉 Training complete! Final vocabulary size: {len(self.vocab)}")
+        # Cached encodings were produced with the old merges
+        self._build_merge_tables()
+        self.clear_cache()
+        
+        elapsed = time.perf_counter() - merge_start
+        self.training_stats = {
+            'event': 'done',
+            'num_merges': iteration,
+            'vocab_size': len(self.vocab),
+            'merges_per_sec': iteration / elapsed if elapsed else 0.0,
+            'mean_words_touched': words_touched_total / iteration if iteration else 0.0,
+            'elapsed_sec': elapsed,
+            'counting_sec': counting_sec,
+            'selection_sec': selection_sec,
+            'merging_sec': merging_sec
+        }
+        if progress_callback is not None:
+            progress_callback(dict(self.training_stats))
+        
+        self._log(f"🎉 Training complete! Final vocabulary size: {len(self.vocab)}")
     
-    def encode(self, text: str) -> List[int]:
+    def encode(self, text: str, mode: str = 'bpe', return_offsets: bool = False):
         """
         Encode text into token IDs.
         
         Args:
             text: Input text to encode
+            mode: 'bpe' replays the learned merges (exact BPE);
+                'longest_match' greedily takes the longest vocabulary token
+                at each position (faster, may differ from BPE, see
+                compare_encoding_modes)
+            return_offsets: Also return the (start, end) character span of
+                each token in text
             
         Returns:
-            List of token IDs
+            List of token IDs, or a tuple (token IDs, offsets) when
+            return_offsets is True
         """
-        # Simple preprocessing
-        text = text.lower().strip()
+        encode_word = self._get_word_encoder(mode)
+        
+        if return_offsets:
+            return self._encode_with_offsets(text, encode_word)
         
         # Add special tokens
         tokens = [self.special_tokens['<BOS>']]
         
-        # Split into words
-        words = re.findall(r'\b\w+\b', text)
+        # Split into words (with the default pre-tokenizer whitespace and
+        # punctuation are kept, so decode(encode(text)) gives back the text)
+        words = self.pre_tokenizer.split(text)
         
         for word in words:
-            # Apply BPE to each word
-            word_tokens = self._encode_word(word)
+            # Encode each word with the selected mode
+            word_tokens = encode_word(word)
             tokens.extend(word_tokens)
         
         tokens.append(self.special_tokens['<EOS>'])
         
         return tokens
     
-    def _encode_word(self, word: str) -> List[int]:
+    def _get_word_encoder(self, mode: str):
         """
-        Encode a single word using BPE.
+        Get the word encoder of an encoding mode.
         
         Args:
-            word: Word to encode
+            mode: One of ENCODING_MODES
             
         Returns:
-            List of token IDs for the word
+            Function mapping a pre-tokenized word to its token IDs
+        """
+        if mode == 'bpe':
+            return self._encode_word_cached
+        if mode == 'longest_match':
+            return self._encode_word_longest_match
+        raise ValueError(f"Unknown encoding mode: {mode!r} (expected one of {ENCODING_MODES})")
+    
+    def iter_encode(self, text_or_file, chunk_chars: int = 1 << 20,
+                    mode: str = 'bpe') -> Iterator[int]:
         """
-        # Start with individual characters
-        tokens = list(word)
+        Lazily encode a long document, yielding one token ID at a time.
         
-        # Apply merges in order
-        for merge in self.merges:
-            new_tokens = []
-            i = 0
-            
-            while i < len(tokens):
-                if i < len(tokens) - 1 and tokens[i] == merge[0] and tokens[i + 1] == merge[1]:
-                    # Merge found
-                    new_tokens.append(merge[0] + merge[1])
-                    i += 2
-                else:
-                    new_tokens.append(tokens[i])
-                    i += 1
+        Produces the same IDs as encode() (including <BOS> and <EOS>)
+        without building the word or token lists. Files are read chunk_chars
+        characters at a time and cut only where the pre-tokenizer starts a
+        new piece, so a word straddling two reads is carried over whole and
+        memory stays bounded by the chunk size.
+        
+        Args:
+            text_or_file: Text string, open text file, or path given as a
+                pathlib.Path (a str is always treated as text)
+            chunk_chars: Number of characters read from a file at a time
+            mode: Encoding mode, see encode()
             
-            tokens = new_tokens
+        Yields:
+            Token IDs
+        """
+        encode_word = self._get_word_encoder(mode)
         
-        # Convert tokens to IDs
-        token_ids = []
-        for token in tokens:
-            if token in self.token_to_id:
-                token_ids.append(self.token_to_id[token])
-            else:
-                token_ids.append(self.special_tokens['<UNK>'])
+        yield self.special_tokens['<BOS>']
         
-        return token_ids
+        if isinstance(text_or_file, str):
+            # finditer walks the string lazily, no chunking needed
+            chunks = [text_or_file]
+        elif isinstance(text_or_file, os.PathLike):
+            chunks = read_text_chunks(os.fspath(text_or_file), chunk_chars)
+        else:
+            chunks = iter_safe_chunks(iter(lambda: text_or_file.read(chunk_chars), ''))
+        
+        iter_words = self.pre_tokenizer.iter_words
+        for chunk in chunks:
+            for word in iter_words(chunk):
+                yield from encode_word(word)
+        
+        yield self.special_tokens['<EOS>']
     
-    def decode(self, token_ids: List[int]) -> str:
+    def _encode_with_offsets(self, text: str, encode_word) -> Tuple[List[int], List[Tuple[int, int]]]:
         """
-        Decode token IDs back to text.
+        Encode text and track the character span of every token.
+        
+        Offsets come from the same pass over the pre-tokenizer matches:
+        each word's start is known from its match and the tokens inside it
+        advance by their byte length. A token that covers only part of a
+        multi-byte character gets the span of the whole character, and when
+        case folding changed the length of a word, all its tokens get the
+        span of the whole word.
         
         Args:
-            token_ids: List of token IDs
+            text: Input text to encode
+            encode_word: Word encoder of the selected mode
             
         Returns:
-            Decoded text
+            Tuple (token IDs, list of (start, end) character offsets)
         """
-        tokens = []
+        vocab = self.vocab
+        tokens = [self.special_tokens['<BOS>']]
+        offsets = [(0, 0)]
         
-        for token_id in token_ids:
-            if token_id in self.vocab:
-                token = self.vocab[token_id]
+        for word, word_start, word_end in self.pre_tokenizer.iter_matches(text):
+            word_ids = encode_word(word)
+            tokens.extend(word_ids)
+            
+            if len(word) != word_end - word_start:
+                # Folding changed the length: characters no longer line up
+                offsets.extend([(word_start, word_end)] * len(word_ids))
+            elif word.isascii():
+                # One byte per character
+                position = word_start
+                for token_id in word_ids:
+                    end = position + len(vocab[token_id])
+                    offsets.append((position, end))
+                    position = end
+            else:
+                # Character index of every byte of the word
+                byte_to_char = []
+                for char_index, char in enumerate(word, word_start):
+                    byte_to_char.extend([char_index] * len(char.encode('utf-8')))
                 
-                # Skip special tokens in output
-                if token not in ['<BOS>', '<EOS>', '<PAD>']:
-                    tokens.append(token)
+                byte_position = 0
+                for token_id in word_ids:
+                    byte_end = byte_position + len(vocab[token_id])
+                    offsets.append((byte_to_char[byte_position], byte_to_char[byte_end - 1] + 1))
+                    byte_position = byte_end
+        
+        tokens.append(self.special_tokens['<EOS>'])
+        offsets.append((len(text), len(text)))
         
-        # Join tokens with spaces (simple reconstruction)
-        return ' '.join(tokens)
+        return tokens, offsets
     
-    def get_vocab_info(self) -> Dict:
+    def encode_to_array(self, texts: List[str], max_len: int, pad: bool = True,
+                        as_tensor: bool = False):
         """
-        Get information about the vocabulary.
+        Encode texts straight into a preallocated int32 array.
+        
+        Token IDs are written word by word into the output buffer, so no
+        per-text Python lists are built and nothing is copied afterwards.
+        Sequences longer than max_len are truncated (dropping <EOS>).
         
+        Args:
+            texts: Texts to encode
+            max_len: Maximum number of tokens per text (including <BOS>/<EOS>)
+            pad: If True, return a (batch, max_len) array padded with <PAD>;
+                if False, return all sequences concatenated in a flat array
+                (the lengths give the boundaries)
+            as_tensor: Return torch tensors sharing memory with the arrays
+            
         Returns:
-            Dictionary with vocabulary statistics
+            Tuple (token_ids, lengths); lengths has shape (batch,)
         """
-        return {
-            'vocab_size': len(self.vocab),
-            'num_merges': len(self.merges),
-            'special_tokens': self.special_tokens,
-            'sample_tokens': {k: v for k, v in list(self.vocab.items())[:20]}
-        }
+        num_texts = len(texts)
+        lengths = np.zeros(num_texts, dtype=np.int32)
+        
+        # One buffer for the whole batch: rows of max_len when padding,
+        # back-to-back sequences otherwise
+        buffer = np.full(num_texts * max_len, self.special_tokens['<PAD>'], dtype=np.int32)
+        
+        offset = 0
+        for index, text in enumerate(texts):
+            start = index * max_len if pad else offset
+            lengths[index] = self._write_token_ids(text, buffer[start:start + max_len])
+            offset += int(lengths[index])
+        
+        token_ids = buffer.reshape(num_texts, max_len) if pad else buffer[:offset]
+        
+        if as_tensor:
+            import torch
+            return torch.from_numpy(token_ids), torch.from_numpy(lengths)
+        
+        return token_ids, lengths
     
-    def visualize_tokenization(self, text: str) -> List[Dict]:
+    def _write_token_ids(self, text: str, out: np.ndarray) -> int:
         """
-        Visualize how text is tokenized step by step.
+        Encode a text into an output array slice (truncating if needed).
         
         Args:
-            text: Input text
+            text: Text to encode
+            out: Array slice to write the token IDs to
             
         Returns:
-            List of token information dictionaries
+            Number of token IDs written
         """
-        token_ids = self.encode(text)
+        capacity = len(out)
+        if capacity == 0:
+            return 0
+        
+        out[0] = self.special_tokens['<BOS>']
+        position = 1
         
-        tokens_info = []
-        for i, token_id in enumerate(token_ids):
-            token_text = self.vocab.get(token_id, '<UNK>')
+        for word in self.pre_tokenizer.split(text):
+            word_ids = self._encode_word_cached(word)
+            end = position + len(word_ids)
             
-            # Determine token type
-            if token_text in self.special_tokens:
-                token_type = 'special'
-            elif len(token_text) == 1:
-                token_type = 'character'
-            else:
-                token_type = 'subword'
+            if end > capacity:
+                out[position:] = word_ids[:capacity - position]
+                return capacity
             
-            tokens_info.append({
-                'position': i,
-                'token_id': token_id,
-                'token_text': token_text,
-                'token_type': token_type
-            })
+            out[position:end] = word_ids
+            position = end
         
-        return tokens_info
-
-
-def create_sample_tokenizer(vocab_size: int = 1000) -> BPETokenizer:
-    """
-    Create a sample tokenizer trained on educational text.
+        if position < capacity:
+            out[position] = self.special_tokens['<EOS>']
+            position += 1
+        
+        return position
     
-    Args:
-        vocab_size: Maximum vocabulary size for the tokenizer
+    def encode_batch(self, texts: List[str], num_workers: Optional[int] = None,
+                     chunk_size: int = 1000) -> List[List[int]]:
+        """
+        Encode many texts, sharding them across a process pool.
+        
+        Args:
+            texts: Texts to encode
+            num_workers: Number of worker processes (defaults to the CPU
+                count; 1 encodes in the current process)
+            chunk_size: Number of texts sent to a worker per task
+            
+        Returns:
+            One list of token IDs per text, in input order
+        """
+        # Small batches are not worth the pool start-up cost
+        if len(texts) <= chunk_size:
+            num_workers = 1
+        
+        return list(self.iter_encode_batch(texts, num_workers=num_workers, chunk_size=chunk_size))
     
-    Returns:
-        Trained BPE tokenizer
-    """
-    # Sample training text about AI and machine learning
-    training_text = """
-    artificial intelligence is transforming the world through machine learning algorithms
-    neural networks learn patterns from data to make predictions and decisions
-    transformers are powerful architectures for natural language processing tasks
-    attention mechanisms help models focus on relevant parts of input sequences
-    large language models can generate human-like text and answer questions
-    deep learning requires computational resources and large datasets for training
-    backpropagation optimizes neural network weights through gradient descent
-    embeddings convert words into dense vector representations for processing
-    """
+    def iter_encode_batch(self, texts: Iterable[str], num_workers: Optional[int] = None,
+                          chunk_size: int = 1000) -> Iterator[List[int]]:
+        """
+        Lazily encode a (possibly huge) stream of texts with a process pool.
+        
+        Each worker receives the tokenizer once, when the pool starts, and
+        then only gets chunks of texts. At most 2 * num_workers chunks are in
+        flight at a time, so memory stays flat however long the input is.
+        
+        Args:
+            texts: Iterable of texts to encode (e.g. an open file)
+            num_workers: Number of worker processes (defaults to the CPU
+                count; 1 encodes in the current process)
+            chunk_size: Number of texts sent to a worker per task
+            
+        Yields:
+            One list of token IDs per text, in input order
+        """
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        
+        chunks = _chunked(texts, chunk_size)
+        
+        if num_workers <= 1:
+            for chunk in chunks:
+                for text in chunk:
+                    yield self.encode(text)
+            return
+        
+        executor = ProcessPoolExecutor(max_workers=num_workers,
+                                       initializer=_init_encode_worker,
+                                       initargs=(self,))
+        try:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(_encode_chunk, chunk))
+                
+                # Keep a bounded number of chunks in flight, in order
+                if len(pending) >= 2 * num_workers:
+                    yield from pending.popleft().result()
+            
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
     
-    tokenizer = BPETokenizer(vocab_size=vocab_size)
-    tokenizer.train(training_text)
+    def _encode_word_cached(self, word: str) -> Tuple[int, ...]:
+        """
+        Encode a single word, using the LRU word cache when possible.
+        
+        Args:
+            word: Word to encode
+            
+        Returns:
+            Tuple of token IDs for the word
+        """
+        cache = self._word_cache
+        token_ids = cache.get(word)
+        
+        if token_ids is not None:
+            self.cache_hits += 1
+            try:
+                cache.move_to_end(word)
+            except KeyError:
+                # Evicted by another thread sharing this tokenizer
+                pass
+            return token_ids
+        
+        self.cache_misses += 1
+        token_ids = tuple(self._encode_word(word))
+        
+        if self.cache_size > 0:
+            cache[word] = token_ids
+            if len(cache) > self.cache_size:
+                # Evict the least recently used word
+                cache.popitem(last=False)
+        
+        return token_ids
     
-    return tokenizer
-
-
-def create_dynamic_tokenizer(user_text: str, vocab_size: int = 1000) -> BPETokenizer:
-    """
-    Create a tokenizer that adapts to the user's input text.
+    def clear_cache(self) -> None:
+        """Drop all cached word encodings (hit/miss counters are kept)."""
+        self._word_cache.clear()
     
-    Args:
-        user_text: The user's input text to include in training
-        vocab_size: Maximum vocabulary size for the tokenizer
+    def _encode_word(self, word: str) -> List[int]:
+        """
+        Encode a single word using BPE.
+        
+        Instead of trying every merge in order, we repeatedly apply the
+        lowest-ranked (earliest learned) pair present in the word. Every
+        symbol in a learned merge was created by an earlier merge, so this
+        gives the same tokens as replaying self.merges one by one, but
+        costs O(n log n) in the word length instead of O(len(merges) * n).
+        The whole merge loop works on integer token IDs, so no strings are
+        concatenated or compared along the way.
+        
+        Args:
+            word: Word to encode
+            
+        Returns:
+            List of token IDs for the word
+        """
+        # Start with the UTF-8 bytes of the word, as token IDs
+        byte_offset = self.byte_offset
+        token_ids = [byte_offset + byte for byte in word.encode('utf-8')]
+        
+        return self._apply_merges(token_ids)
     
-    Returns:
-        Trained BPE tokenizer adapted to the user's text
-    """
-    # Base training text for common words and patterns
-    base_text = """
-    the and is are was were will be been being have has had do does did
-    can could would should might must may shall will would
-    I you he she it we they me him her us them my your his her its our their
-    this that these those a an some any all each every
-    in on at by for with from to of about through during before after
-    what when where why how who which whose whom
-    """
+    def _build_merge_tables(self) -> None:
+        """
+        Rebuild the integer merge tables from self.merges.
+        
+        Every merge string is mapped through token_to_id, so a string that
+        was produced by two different merges ends up as one ID, exactly as
+        it is one symbol for the string-based encoder.
+        """
+        self.merge_pair_ranks = {}
+        self.merge_left_ids = array('i')
+        self.merge_right_ids = array('i')
+        self.merge_new_ids = array('i')
+        self._trie = None
+        self._token_tables = None
+        self._decode_tables = None
+        
+        for rank, (left, right) in enumerate(self.merges):
+            left_id = self.token_to_id[left]
+            right_id = self.token_to_id[right]
+            
+            self.merge_left_ids.append(left_id)
+            self.merge_right_ids.append(right_id)
+            self.merge_new_ids.append(self.token_to_id[left + right])
+            self.merge_pair_ranks.setdefault(left_id << 32 | right_id, rank)
     
-    # Combine base text with user input (give more weight to user text)
-    combined_text = f"{base_text} {user_text} {user_text} {user_text}"
+    def _apply_merges(self, token_ids: List[int]) -> List[int]:
+        """
+        Merge token IDs by rank using a heap over a linked list of positions.
+        
+        Args:
+            token_ids: Initial token IDs (characters) of a word
+            
+        Returns:
+            Token IDs after all applicable merges
+        """
+        ranks = self.merge_pair_ranks
+        new_ids = self.merge_new_ids
+        if len(token_ids) < 2 or not ranks:
+            return token_ids
+        
+        # Doubly linked list over positions; merged-away positions become -1
+        prev_pos = list(range(-1, len(token_ids) - 1))
+        next_pos = list(range(1, len(token_ids) + 1))
+        next_pos[-1] = -1
+        
+        # Candidate merges as (rank, left position); ties go to the leftmost
+        heap = []
+        for i in range(len(token_ids) - 1):
+            rank = ranks.get(token_ids[i] << 32 | token_ids[i + 1])
+            if rank is not None:
+                heap.append((rank, i))
+        heapq.heapify(heap)
+        
+        while heap:
+            rank, i = heapq.heappop(heap)
+            j = next_pos[i]
+            
+            # Skip entries whose pair no longer exists
+            if token_ids[i] < 0 or j == -1 or ranks.get(token_ids[i] << 32 | token_ids[j]) != rank:
+                continue
+            
+            # Merge position j into position i and unlink j
+            token_ids[i] = new_ids[rank]
+            token_ids[j] = -1
+            next_pos[i] = next_pos[j]
+            if next_pos[j] != -1:
+                prev_pos[next_pos[j]] = i
+            
+            # The merged token forms new pairs with both neighbours
+            if prev_pos[i] != -1:
+                left_rank = ranks.get(token_ids[prev_pos[i]] << 32 | token_ids[i])
+                if left_rank is not None:
+                    heapq.heappush(heap, (left_rank, prev_pos[i]))
+            if next_pos[i] != -1:
+                right_rank = ranks.get(token_ids[i] << 32 | token_ids[next_pos[i]])
+                if right_rank is not None:
+                    heapq.heappush(heap, (right_rank, i))
+        
+        return [token_id for token_id in token_ids if token_id >= 0]
     
-    print(f"🚀 Training dynamic tokenizer for: '{user_text[:50]}{'...' if len(user_text) > 50 else ''}'")
+    def _encode_word_sequential(self, word: str) -> List[int]:
+        """
+        Encode a single word by replaying every merge in order.
+        
+        This is the original, easy-to-follow version of _encode_word. It is
+        kept as a reference to check the rank-based encoder against.
+        
+        Args:
+            word: Word to encode
+            
+        Returns:
+            List of token IDs for the word
+        """
+        # Start with individual bytes
+        tokens = list(to_byte_string(word))
+        
+        # Apply merges in order
+        for merge in self.merges:
+            tokens = merge_symbol_pair(tokens, merge)
+        
+        # Convert tokens to IDs
+        token_ids = []
+        for token in tokens:
+            if token in self.token_to_id:
+                token_ids.append(self.token_to_id[token])
+            else:
+                token_ids.append(self.special_tokens['<UNK>'])
+        
+        return token_ids
+    
+    def _build_trie(self) -> Dict:
+        """
+        Compile the vocabulary into a character trie.
+        
+        Each node is a dict from the next (byte) character to the child
+        node; the key None holds the ID of the token that ends at the node.
+        
+        Returns:
+            The root node
+        """
+        root = {}
+        
+        for token, token_id in self.token_to_id.items():
+            if token in self.special_tokens:
+                continue
+            node = root
+            for char in token:
+                node = node.setdefault(char, {})
+            node[None] = token_id
+        
+        return root
+    
+    def _encode_word_longest_match(self, word: str) -> List[int]:
+        """
+        Encode a word by greedy longest match against the vocabulary.
+        
+        Every byte is a token, so a match of at least one byte always exists
+        and the result never contains <UNK>.
+        
+        Args:
+            word: Word to encode
+            
+        Returns:
+            List of token IDs for the word
+        """
+        if self._trie is None:
+            self._trie = self._build_trie()
+        root = self._trie
+        
+        chars = to_byte_string(word)
+        token_ids = []
+        start = 0
+        
+        while start < len(chars):
+            node = root
+            match_id = None
+            match_end = start
+            
+            # Walk down the trie, remembering the longest token seen so far
+            position = start
+            while position < len(chars):
+                node = node.get(chars[position])
+                if node is None:
+                    break
+                position += 1
+                if None in node:
+                    match_id = node[None]
+                    match_end = position
+            
+            token_ids.append(match_id)
+            start = match_end
+        
+        return token_ids
+    
+    def compare_encoding_modes(self, texts: Iterable[str]) -> Dict:
+        """
+        Measure how often longest-match encoding disagrees with exact BPE.
+        
+        Args:
+            texts: Corpus to compare on
+            
+        Returns:
+            Dictionary with word and token counts for both modes and the
+            share of words whose tokenization differs
+        """
+        total_words = 0
+        differing_words = 0
+        bpe_tokens = 0
+        longest_match_tokens = 0
+        
+        for text in texts:
+            for word in self.pre_tokenizer.split(text):
+                bpe_ids = self._encode_word_cached(word)
+                longest_match_ids = self._encode_word_longest_match(word)
+                
+                total_words += 1
+                bpe_tokens += len(bpe_ids)
+                longest_match_tokens += len(longest_match_ids)
+                if list(bpe_ids) != longest_match_ids:
+                    differing_words += 1
+        
+        return {
+            'words': total_words,
+            'differing_words': differing_words,
+            'word_disagreement_rate': differing_words / total_words if total_words else 0.0,
+            'bpe_tokens': bpe_tokens,
+            'longest_match_tokens': longest_match_tokens
+        }
+    
+    def _get_decode_tables(self) -> Tuple[Optional[List[bytes]], np.ndarray]:
+        """
+        Get the decoding tables, building them once per vocabulary.
+        
+        An attached tokenizer (see attach_shared) gets no bytes table: its
+        token bytes are gathered straight from the shared buffer (see
+        _VocabView.join_bytes), so only the one-byte-per-ID mask is private.
+        
+        Returns:
+            Tuple (bytes of every ID, empty for IDs that decode to nothing,
+            or None for shared views; boolean mask of those IDs: <BOS>,
+            <EOS>, <PAD> and unused IDs)
+        """
+        if self._decode_tables is None:
+            table_size = max(self.vocab) + 1
+            skip_mask = np.ones(table_size, dtype=bool)
+            skip_mask[list(self.vocab)] = False
+            for token in ('<BOS>', '<EOS>', '<PAD>'):
+                skip_mask[self.special_tokens[token]] = True
+            
+            pieces = None
+            if isinstance(self.vocab, dict):
+                pieces = [b''] * table_size
+                for token_id, token in self.vocab.items():
+                    if not skip_mask[token_id]:
+                        pieces[token_id] = token.encode('latin-1')
+            
+            self._decode_tables = (pieces, skip_mask)
+        
+        return self._decode_tables
+    
+    def decode(self, token_ids: List[int]) -> str:
+        """
+        Decode token IDs back to text.
+        
+        Every ID is looked up in a dense table of byte strings, so there is
+        no per-token membership test; <BOS>, <EOS> and <PAD> map to empty
+        bytes. IDs outside the vocabulary are skipped.
+        
+        Args:
+            token_ids: Token IDs: a list, a 1-D NumPy array / tensor, or any
+                iterable (e.g. the output of iter_encode)
+            
+        Returns:
+            Decoded text
+        """
+        if hasattr(token_ids, 'tolist'):
+            token_ids = token_ids.tolist()
+        elif not isinstance(token_ids, (list, tuple)):
+            # Iterators can only be walked once (see the min() check below)
+            token_ids = list(token_ids)
+        
+        pieces, skip_mask = self._get_decode_tables()
+        
+        if pieces is None:
+            # Shared views: gather the bytes from the buffer in one pass
+            token_ids = np.asarray(token_ids, dtype=np.int64).ravel()
+            in_range = (token_ids >= 0) & (token_ids < len(skip_mask))
+            token_ids = token_ids[in_range]
+            data = self.vocab.join_bytes(token_ids[~skip_mask[token_ids]])
+            return data.decode('utf-8', errors='replace')
+        
+        try:
+            # Negative IDs would silently index from the end of the table
+            if token_ids and min(token_ids) < 0:
+                raise IndexError
+            data = b''.join(map(pieces.__getitem__, token_ids))
+        except IndexError:
+            table_size = len(pieces)
+            data = b''.join(pieces[token_id] for token_id in token_ids
+                            if 0 <= token_id < table_size)
+        
+        # Invalid UTF-8 (e.g. a cut multi-byte character) becomes U+FFFD
+        return data.decode('utf-8', errors='replace')
+    
+    def decode_batch(self, batch) -> List[str]:
+        """
+        Decode many token ID sequences in one call.
+        
+        A 2-D NumPy array or tensor (e.g. from encode_to_array or a model's
+        sampled output) is filtered with the precomputed skip mask for the
+        whole batch at once, so padding and special tokens never reach the
+        per-row join.
+        
+        Args:
+            batch: List of token ID sequences, or a 2-D array / tensor of
+                shape (num_sequences, seq_len)
+            
+        Returns:
+            One decoded text per sequence
+        """
+        if hasattr(batch, 'detach'):
+            # torch tensor
+            batch = batch.detach().cpu().numpy()
+        
+        if not isinstance(batch, np.ndarray):
+            return [self.decode(token_ids) for token_ids in batch]
+        
+        if batch.ndim != 2:
+            raise ValueError(f"Expected a 2-D array of token IDs, got shape {batch.shape}")
+        
+        pieces, skip_mask = self._get_decode_tables()
+        
+        # One vectorized pass: which positions produce text
+        in_range = (batch >= 0) & (batch < len(skip_mask))
+        keep = in_range & ~skip_mask[np.where(in_range, batch, 0)]
+        
+        if pieces is None:
+            join = self.vocab.join_bytes
+        else:
+            def join(token_ids: np.ndarray) -> bytes:
+                return b''.join(map(pieces.__getitem__, token_ids.tolist()))
+        
+        return [join(row[row_keep]).decode('utf-8', errors='replace')
+                for row, row_keep in zip(batch, keep)]
+    
+    def token_text(self, token_id: int) -> str:
+        """
+        Get a readable text for a token.
+        
+        Args:
+            token_id: Token ID
+            
+        Returns:
+            The token's text (special tokens by name, bytes that are not
+            valid UTF-8 on their own as U+FFFD)
+        """
+        token = self.vocab.get(token_id, '<UNK>')
+        if token in self.special_tokens:
+            return token
+        return from_byte_string(token)
+    
+    def get_vocab_info(self) -> Dict:
+        """
+        Get information about the vocabulary.
+        
+        Returns:
+            Dictionary with vocabulary statistics
+        """
+        return {
+            'vocab_size': len(self.vocab),
+            'num_merges': len(self.merges),
+            'special_tokens': self.special_tokens,
+            'sample_tokens': {k: v for k, v in list(self.vocab.items())[:20]},
+            'word_cache': {
+                'size': len(self._word_cache),
+                'max_size': self.cache_size,
+                'hits': self.cache_hits,
+                'misses': self.cache_misses
+            }
+        }
+    
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the tokenizer in a compact, versioned binary format.
+        
+        Layout (little-endian), see _TOKENIZER_HEADER:
+        
+            header       magic, format version, vocab_size limit and the
+                         counts of tokens, merges, special tokens, blob bytes
+            token_ids    uint32[num_tokens]      (ascending)
+            offsets      uint32[num_tokens + 1]  (into the blob)
+            merge_left   int32[num_merges]
+            merge_right  int32[num_merges]
+            merge_new    int32[num_merges]       (position = merge rank)
+            special_ids  uint32[num_special]
+            sorted_order uint32[num_tokens]      (token positions sorted by text, then ID)
+            blob         all token strings, concatenated, one byte per character
+            pre_tokenizer uint32 byte length, then UTF-8 JSON of
+                         PreTokenizer.to_dict()
+        
+        The tables can be used straight from a memory-mapped file, so
+        load(mmap=True) is fast and worker processes share the pages.
+        
+        Returns:
+            The serialized tokenizer
+        """
+        token_ids = sorted(self.vocab)
+        token_blobs = [self.vocab[token_id].encode('latin-1') for token_id in token_ids]
+        
+        offsets = array('I', [0])
+        for token_blob in token_blobs:
+            offsets.append(offsets[-1] + len(token_blob))
+        text_blob = b''.join(token_blobs)
+        
+        # Lets token_to_id be answered by binary search over the blob
+        sorted_order = sorted(range(len(token_ids)), key=lambda i: (token_blobs[i], token_ids[i]))
+        
+        header = _TOKENIZER_HEADER.pack(
+            _TOKENIZER_MAGIC, _TOKENIZER_FORMAT_VERSION, self.vocab_size,
+            len(token_ids), len(self.merges), len(self.special_tokens), len(text_blob)
+        )
+        sections = [
+            array('I', token_ids),
+            offsets,
+            array('i', self.merge_left_ids),
+            array('i', self.merge_right_ids),
+            array('i', self.merge_new_ids),
+            array('I', self.special_tokens.values()),
+            array('I', sorted_order)
+        ]
+        if sys.byteorder != 'little':
+            for section in sections:
+                section.byteswap()
+        
+        pre_tokenizer = json.dumps(self.pre_tokenizer.to_dict()).encode('utf-8')
+        
+        return b''.join([header] + [section.tobytes() for section in sections] +
+                        [text_blob, struct.pack('<I', len(pre_tokenizer)), pre_tokenizer])
+    
+    def save(self, path: str) -> None:
+        """
+        Save the tokenizer in the binary format of to_bytes().
+        
+        Args:
+            path: Destination file path
+        """
+        _write_atomically(path, self.to_bytes())
+    
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, cache_size: int = 10000,
+             lazy: bool = False, verbose: bool = True) -> 'BPETokenizer':
+        """
+        Load a tokenizer written by save().
+        
+        Args:
+            path: Path of the saved tokenizer
+            mmap: Memory-map the file instead of reading it, so the merge
+                tables are used in place and shared between processes
+            cache_size: Size of the word cache of the loaded tokenizer
+            lazy: Keep vocab, token_to_id and merges as read-only views
+                into the file instead of building them (see from_buffer)
+            verbose: Print progress when the loaded tokenizer is trained
+            
+        Returns:
+            The loaded tokenizer
+        """
+        with open(path, 'rb') as f:
+            if mmap:
+                buffer = _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ)
+            else:
+                buffer = f.read()
+        
+        return cls.from_buffer(buffer, cache_size=cache_size, lazy=lazy, verbose=verbose)
+    
+    def publish_shared(self, path: Optional[str] = None) -> str:
+        """
+        Publish the tokenizer for other processes to attach with attach_shared.
+        
+        The tables are written to a file in shared memory (/dev/shm where it
+        exists, the temporary directory otherwise). Every process that
+        attaches maps the same physical pages, so adding workers does not
+        add copies of the vocabulary. Remove the file when no new process
+        needs to attach; attached processes keep their mapping.
+        
+        Args:
+            path: File to publish to (defaults to a name derived from the
+                content, so publishing the same tokenizer twice reuses it)
+            
+        Returns:
+            Path to pass to attach_shared
+        """
+        data = self.to_bytes()
+        
+        if path is None:
+            directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+            digest = hashlib.sha256(data).hexdigest()[:16]
+            path = os.path.join(directory, f"bpe_tokenizer_{digest}.bin")
+        
+        _write_atomically(path, data)
+        
+        return path
+    
+    @classmethod
+    def attach_shared(cls, path: str, cache_size: int = 10000,
+                      verbose: bool = True) -> 'BPETokenizer':
+        """
+        Attach to a tokenizer published with publish_shared.
+        
+        The vocabulary, token_to_id, merges and merge tables are read-only
+        views into the shared mapping; only the integer pair -> rank index
+        used by the encoder and the word cache are private to the process.
+        Training or pruning the attached tokenizer first copies the tables.
+        
+        Args:
+            path: Path returned by publish_shared
+            cache_size: Size of the word cache of the tokenizer
+            verbose: Print progress when the tokenizer is trained
+            
+        Returns:
+            The attached tokenizer
+        """
+        return cls.load(path, mmap=True, cache_size=cache_size, lazy=True, verbose=verbose)
+    
+    @classmethod
+    def from_buffer(cls, buffer, cache_size: int = 10000, lazy: bool = False,
+                    verbose: bool = True) -> 'BPETokenizer':
+        """
+        Build a tokenizer from the bytes of a saved tokenizer.
+        
+        The merge tables stay views into the buffer (no copy) when the
+        platform is little-endian.
+        
+        Args:
+            buffer: Any bytes-like object holding the save() layout
+            cache_size: Size of the word cache of the tokenizer
+            lazy: Also keep vocab, token_to_id and merges as read-only
+                views into the buffer instead of dictionaries of strings
+                (format version 3 and later; older files load eagerly)
+            verbose: Print progress when the tokenizer is trained
+            
+        Returns:
+            The tokenizer
+        """
+        view = memoryview(buffer)
+        (magic, version, vocab_size, num_tokens, num_merges,
+         num_special, blob_chars) = _TOKENIZER_HEADER.unpack_from(view, 0)
+        
+        if magic != _TOKENIZER_MAGIC:
+            raise ValueError("Not a saved BPETokenizer file")
+        if version not in _SUPPORTED_FORMAT_VERSIONS:
+            raise ValueError(f"Unsupported tokenizer format version: {version}")
+        
+        # Version 2 stored the blob as UTF-8 and had no sorted_order section
+        section_counts = [('I', num_tokens), ('I', num_tokens + 1),
+                          ('i', num_merges), ('i', num_merges), ('i', num_merges),
+                          ('I', num_special)]
+        if version >= 3:
+            section_counts.append(('I', num_tokens))
+        
+        position = _TOKENIZER_HEADER.size
+        sections = []
+        for typecode, count in section_counts:
+            section = view[position:position + 4 * count].cast(typecode)
+            if sys.byteorder != 'little':
+                section = array(typecode, section)
+                section.byteswap()
+            sections.append(section)
+            position += 4 * count
+        token_ids, offsets, left_ids, right_ids, new_ids, special_ids = sections[:6]
+        
+        # Versions 2 and 3 end with the blob and used the default pre-tokenizer
+        pre_tokenizer = None
+        if version >= 4:
+            blob = view[position:position + blob_chars]
+            position += blob_chars
+            (length,) = struct.unpack_from('<I', view, position)
+            position += 4
+            pre_tokenizer = PreTokenizer.from_dict(
+                json.loads(bytes(view[position:position + length]).decode('utf-8')))
+        else:
+            blob = view[position:]
+        
+        tokenizer = cls(vocab_size=vocab_size, cache_size=cache_size, verbose=verbose,
+                        pre_tokenizer=pre_tokenizer)
+        tokenizer.byte_offset = num_special
+        
+        if lazy and version >= 3:
+            tokenizer.vocab = _VocabView(token_ids, offsets, blob)
+            tokenizer.token_to_id = _TokenIndexView(token_ids, offsets, sections[6], blob)
+            tokenizer.merges = _MergesView(left_ids, right_ids, tokenizer.vocab)
+        else:
+            # Rebuild the string tables used by training and the visualizations
+            text_blob = str(blob, 'latin-1' if version >= 3 else 'utf-8')
+            tokenizer.vocab = {
+                token_id: text_blob[offsets[i]:offsets[i + 1]]
+                for i, token_id in enumerate(token_ids)
+            }
+            tokenizer.token_to_id = {}
+            for token_id in token_ids:
+                # Later IDs win, as they did during training
+                tokenizer.token_to_id[tokenizer.vocab[token_id]] = token_id
+            tokenizer.merges = [
+                (tokenizer.vocab[left_id], tokenizer.vocab[right_id])
+                for left_id, right_id in zip(left_ids, right_ids)
+            ]
+        tokenizer.special_tokens = {tokenizer.vocab[token_id]: token_id for token_id in special_ids}
+        
+        # The merge tables are used in place
+        tokenizer.merge_left_ids = left_ids
+        tokenizer.merge_right_ids = right_ids
+        tokenizer.merge_new_ids = new_ids
+        tokenizer.merge_pair_ranks = {}
+        for rank in range(num_merges - 1, -1, -1):
+            # Iterating backwards leaves the first rank of duplicate pairs
+            tokenizer.merge_pair_ranks[left_ids[rank] << 32 | right_ids[rank]] = rank
+        tokenizer._mapped_buffer = buffer if isinstance(buffer, _mmap.mmap) else None
+        
+        return tokenizer
+    
+    def export_json(self, path: str) -> None:
+        """
+        Export the vocabulary and merges as human-readable JSON.
+        
+        Args:
+            path: Destination file path
+        """
+        data = {
+            'format_version': _TOKENIZER_FORMAT_VERSION,
+            'vocab_size': self.vocab_size,
+            'special_tokens': self.special_tokens,
+            'pre_tokenizer': self.pre_tokenizer.to_dict(),
+            'vocab': {str(token_id): token for token_id, token in sorted(self.vocab.items())},
+            'merges': [list(pair) for pair in self.merges]
+        }
+        
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    
+    def _get_token_tables(self) -> Tuple[Sequence[str], np.ndarray]:
+        """
+        Get lookup tables indexed by token ID, building them once per vocabulary.
+        
+        An attached tokenizer (see attach_shared) keeps no private list of
+        texts: they are computed from the shared buffer when looked up.
+        
+        Returns:
+            Tuple (display text of every ID, uint8 type code of every ID;
+            see TOKEN_TYPES)
+        """
+        if self._token_tables is None:
+            table_size = max(self.vocab) + 1
+            shared = not isinstance(self.vocab, dict)
+            texts = _TokenTextTable(self, table_size) if shared else ['<UNK>'] * table_size
+            type_codes = np.full(table_size, TOKEN_TYPES.index('special'), dtype=np.uint8)
+            
+            for token_id in self.vocab:
+                token_text = self.token_text(token_id)
+                if not shared:
+                    texts[token_id] = token_text
+                
+                # Determine token type
+                if token_text in self.special_tokens:
+                    token_type = 'special'
+                elif len(token_text) == 1:
+                    token_type = 'character'
+                else:
+                    token_type = 'subword'
+                type_codes[token_id] = TOKEN_TYPES.index(token_type)
+            
+            self._token_tables = (texts, type_codes)
+        
+        return self._token_tables
+    
+    def tokenize_columns(self, text: str) -> 'TokenizationColumns':
+        """
+        Tokenize text into parallel columns for visualization.
+        
+        Token IDs and character offsets come from a single encoding pass;
+        token types are then looked up for all tokens at once in a
+        per-vocabulary table instead of being classified one by one.
+        
+        Args:
+            text: Input text
+            
+        Returns:
+            Columnar tokenization result
+        """
+        token_ids, offsets = self.encode(text, return_offsets=True)
+        texts_table, type_table = self._get_token_tables()
+        
+        token_ids = np.asarray(token_ids, dtype=np.int32)
+        
+        return TokenizationColumns(
+            token_ids=token_ids,
+            token_types=type_table[token_ids],
+            offsets=np.asarray(offsets, dtype=np.int32).reshape(-1, 2),
+            texts_table=texts_table
+        )
+    
+    def visualize_tokenization(self, text: str) -> 'TokenizationColumns':
+        """
+        Visualize how text is tokenized step by step.
+        
+        Args:
+            text: Input text
+            
+        Returns:
+            Columnar result (see tokenize_columns) that also behaves like
+            the list of token information dictionaries
+        """
+        return self.tokenize_columns(text)
+
+
+class _TokenTextTable:
+    """Display text of every token ID, computed on lookup (see _get_token_tables)."""
+    
+    def __init__(self, tokenizer: BPETokenizer, size: int):
+        self._tokenizer = tokenizer
+        self._size = size
+    
+    def __getitem__(self, token_id: int) -> str:
+        return self._tokenizer.token_text(token_id)
+    
+    def __len__(self) -> int:
+        return self._size
+
+
+class _VocabView(Mapping):
+    """Read-only token ID -> token string mapping over a saved tokenizer's buffer."""
+    
+    def __init__(self, token_ids, offsets, blob):
+        self._token_ids = token_ids
+        self._offsets = offsets
+        self._blob = blob
+        # IDs are normally 0..n-1, so the ID is its own position
+        self._contiguous = len(token_ids) == 0 or token_ids[-1] == len(token_ids) - 1
+        
+        # NumPy views of the same buffer for join_bytes (no copy)
+        self._id_array = np.frombuffer(token_ids, dtype=np.uint32)
+        self._offset_array = np.frombuffer(offsets, dtype=np.uint32)
+        self._blob_array = np.frombuffer(blob, dtype=np.uint8)
+    
+    def join_bytes(self, token_ids: np.ndarray) -> bytes:
+        """
+        Concatenate the bytes of many tokens, gathered straight from the buffer.
+        
+        Args:
+            token_ids: Array of IDs that are all in the vocabulary
+            
+        Returns:
+            The tokens' bytes, concatenated
+        """
+        if self._contiguous:
+            positions = token_ids
+        else:
+            positions = np.searchsorted(self._id_array, token_ids)
+        
+        starts = self._offset_array[positions].astype(np.int64)
+        lengths = self._offset_array[positions + 1].astype(np.int64) - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return b''
+        
+        # Buffer index of every output byte: each token's start, shifted
+        # back by where its bytes begin in the output, plus the output index
+        shifts = starts - (np.cumsum(lengths) - lengths)
+        return self._blob_array[np.repeat(shifts, lengths) + np.arange(total)].tobytes()
+    
+    def _position(self, token_id) -> int:
+        try:
+            token_id = operator.index(token_id)
+        except TypeError:
+            raise KeyError(token_id) from None
+        if self._contiguous:
+            if 0 <= token_id < len(self._token_ids):
+                return token_id
+        else:
+            position = bisect.bisect_left(self._token_ids, token_id)
+            if position < len(self._token_ids) and self._token_ids[position] == token_id:
+                return position
+        raise KeyError(token_id)
+    
+    def __getitem__(self, token_id) -> str:
+        position = self._position(token_id)
+        return str(self._blob[self._offsets[position]:self._offsets[position + 1]], 'latin-1')
+    
+    def __contains__(self, token_id) -> bool:
+        try:
+            self._position(token_id)
+        except KeyError:
+            return False
+        return True
+    
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._token_ids)
+    
+    def __len__(self) -> int:
+        return len(self._token_ids)
+
+
+class _TokenIndexView(Mapping):
+    """Read-only token string -> token ID mapping using binary search over the buffer."""
+    
+    def __init__(self, token_ids, offsets, sorted_order, blob):
+        self._token_ids = token_ids
+        self._offsets = offsets
+        self._sorted_order = sorted_order
+        self._blob = blob
+        self._length = None
+    
+    def _token_bytes(self, position: int) -> bytes:
+        return bytes(self._blob[self._offsets[position]:self._offsets[position + 1]])
+    
+    def __getitem__(self, token: str) -> int:
+        try:
+            key = token.encode('latin-1')
+        except (AttributeError, UnicodeEncodeError):
+            raise KeyError(token) from None
+        
+        # Rightmost entry with this text: later IDs win, as in training
+        order = self._sorted_order
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            if key < self._token_bytes(order[middle]):
+                high = middle
+            else:
+                low = middle + 1
+        
+        if low and self._token_bytes(order[low - 1]) == key:
+            return self._token_ids[order[low - 1]]
+        raise KeyError(token)
+    
+    def __iter__(self) -> Iterator[str]:
+        order = self._sorted_order
+        for i, position in enumerate(order):
+            token_bytes = self._token_bytes(position)
+            # Duplicate texts are next to each other; report each once
+            if i + 1 < len(order) and self._token_bytes(order[i + 1]) == token_bytes:
+                continue
+            yield str(token_bytes, 'latin-1')
+    
+    def __len__(self) -> int:
+        if self._length is None:
+            self._length = sum(1 for _ in self)
+        return self._length
+
+
+class _MergesView(Sequence):
+    """Read-only list of merge pairs (as token strings) over a saved tokenizer's buffer."""
+    
+    def __init__(self, left_ids, right_ids, vocab: Mapping):
+        self._left_ids = left_ids
+        self._right_ids = right_ids
+        self._vocab = vocab
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return (self._vocab[self._left_ids[index]], self._vocab[self._right_ids[index]])
+    
+    def __len__(self) -> int:
+        return len(self._left_ids)
+    
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, _MergesView)):
+            return list(self) == list(other)
+        return NotImplemented
+
+
+class TokenizationColumns(Sequence):
+    """
+    Tokenization result stored as parallel columns.
+    
+    Columns (one entry per token):
+    
+    - token_ids: int32 array of token IDs
+    - token_types: uint8 array of type codes (index into TOKEN_TYPES)
+    - positions: int32 array of token positions
+    - offsets: int32 array of shape (n, 2) with character spans in the text
+    - token_texts: list of token texts (built on first access)
+    
+    For compatibility it is also a read-only sequence of dictionaries with
+    'position', 'token_id', 'token_text' and 'token_type'; each dictionary
+    is created only when that item is accessed.
+    """
+    
+    def __init__(self, token_ids: np.ndarray, token_types: np.ndarray,
+                 offsets: np.ndarray, texts_table: List[str]):
+        """
+        Initialize the columns.
+        
+        Args:
+            token_ids: Token IDs
+            token_types: Type codes of the tokens
+            offsets: Character spans of the tokens
+            texts_table: Display text of every token ID
+        """
+        self.token_ids = token_ids
+        self.token_types = token_types
+        self.offsets = offsets
+        self.positions = np.arange(len(token_ids), dtype=np.int32)
+        self._texts_table = texts_table
+        self._token_texts = None
+    
+    @property
+    def token_texts(self) -> List[str]:
+        """Texts of the tokens."""
+        if self._token_texts is None:
+            table = self._texts_table
+            self._token_texts = [table[token_id] for token_id in self.token_ids.tolist()]
+        return self._token_texts
+    
+    def __len__(self) -> int:
+        return len(self.token_ids)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        
+        token_id = int(self.token_ids[index])
+        return {
+            'position': int(self.positions[index]),
+            'token_id': token_id,
+            'token_text': self._texts_table[token_id],
+            'token_type': TOKEN_TYPES[self.token_types[index]]
+        }
+    
+    def to_dict(self) -> Dict[str, List]:
+        """
+        Get the columns as a dictionary of lists (e.g. for pandas.DataFrame).
+        
+        Returns:
+            Dictionary with the same keys as the per-token dictionaries
+        """
+        return {
+            'position': self.positions.tolist(),
+            'token_id': self.token_ids.tolist(),
+            'token_text': self.token_texts,
+            'token_type': [TOKEN_TYPES[code] for code in self.token_types.tolist()]
+        }
+
+
+# Token type names; TokenizationColumns.token_types holds indices into this
+TOKEN_TYPES = ('special', 'character', 'subword')
+
+# Word encoders selectable with BPETokenizer.encode(mode=...)
+ENCODING_MODES = ('bpe', 'longest_match')
+
+# Binary tokenizer file format (see BPETokenizer.save)
+_TOKENIZER_MAGIC = b'BPETOKN\x00'
+_TOKENIZER_FORMAT_VERSION = 4
+_SUPPORTED_FORMAT_VERSIONS = (2, 3, 4)
+_TOKENIZER_HEADER = struct.Struct('<8sIIIIIQ')
+
+
+# Tokenizer owned by each encode_batch worker process, set once at pool start-up
+_worker_tokenizer: Optional[BPETokenizer] = None
+
+
+def _write_atomically(path: str, data: bytes) -> None:
+    """
+    Write a file so that readers never see it partially written.
+    
+    The data goes to a temporary file next to path, which then replaces
+    path; if writing fails, the temporary file is removed.
+    
+    Args:
+        path: Destination file path
+        data: File contents
+    """
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _init_encode_worker(tokenizer: BPETokenizer) -> None:
+    """Pool initializer: keep the tokenizer for all later tasks."""
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+
+
+def _encode_chunk(texts: List[str]) -> List[List[int]]:
+    """Encode a chunk of texts inside a worker process."""
+    return [_worker_tokenizer.encode(text) for text in texts]
+
+
+def _count_text(text: str) -> Counter:
+    """Count the words of one piece of text inside a worker process."""
+    return _worker_tokenizer._get_word_frequencies(text)
+
+
+def _count_file_range(task: Tuple[str, int, int, str]) -> Counter:
+    """Count the words in a byte range of a file inside a worker process."""
+    path, start, end, encoding = task
+    
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    
+    # Translate line endings like text mode does on the serial path (a
+    # range never ends between '\r' and '\n', see _find_safe_line_break)
+    text = data.decode(encoding).replace('\r\n', '\n').replace('\r', '\n')
+    
+    return _worker_tokenizer._get_word_frequencies(text)
+
+
+def split_at_line_boundaries(text: str, num_parts: int) -> List[Tuple[int, int]]:
+    """
+    Split a text into about num_parts (start, end) ranges at line breaks.
+    
+    Ranges are cut where the whitespace run holding a line break begins
+    (right after the line's last non-space character, e.g. before '\r\n'
+    or trailing spaces). The pre-tokenizer always starts a new piece
+    there, so counting the ranges separately gives the same words as the
+    whole text.
+    
+    Args:
+        text: Text to split
+        num_parts: Desired number of ranges
+        
+    Returns:
+        Consecutive, non-empty ranges covering the whole text
+    """
+    ranges = []
+    start = 0
+    part_size = max(1, len(text) // max(1, num_parts))
+    
+    while start < len(text):
+        line_break = _SAFE_LINE_BREAK.search(text, start + part_size)
+        end = line_break.start() if line_break else len(text)
+        ranges.append((start, end))
+        start = end
+    
+    return ranges
+
+
+def _find_safe_line_break(f, position: int, file_size: int,
+                          block_size: int = 1 << 16) -> int:
+    """
+    Find the first byte offset >= position in a UTF-8 file where a
+    whitespace run holding a newline begins right after a non-space
+    character (or file_size if there is none).
+    """
+    while position < file_size:
+        # Read a few bytes before position to see the preceding character
+        block_start = max(0, position - 4)
+        f.seek(block_start)
+        block = f.read(position - block_start + block_size)
+        lowest = position - block_start
+        
+        newline = block.find(b'\n', lowest)
+        while newline != -1:
+            # Walk back over the whitespace before the newline, one
+            # character at a time (newlines are character boundaries)
+            cut = newline
+            while True:
+                previous = block[max(0, cut - 4):cut].decode('utf-8', errors='ignore')[-1:]
+                if previous and not previous.isspace():
+                    break
+                cut -= len(previous.encode('utf-8'))
+                if not previous or cut < lowest:
+                    # Start of the file, or the run began before position:
+                    # try the next line
+                    cut = -1
+                    break
+            
+            if cut > 0:
+                return block_start + cut
+            newline = block.find(b'\n', newline + 1)
+        
+        position = block_start + len(block)
+    
+    return file_size
+
+
+def line_aligned_byte_ranges(path: str, num_parts: int) -> List[Tuple[int, int]]:
+    """
+    Split a UTF-8 file into about num_parts byte ranges at line breaks.
+    
+    Like split_at_line_boundaries, ranges are cut where the whitespace run
+    holding a line break begins.
+    
+    Args:
+        path: Path of the file
+        num_parts: Desired number of ranges
+        
+    Returns:
+        Consecutive, non-empty (start, end) byte ranges covering the file
+    """
+    file_size = os.path.getsize(path)
+    part_size = max(1, file_size // max(1, num_parts))
+    ranges = []
+    start = 0
+    
+    with open(path, 'rb') as f:
+        while start < file_size:
+            end = _find_safe_line_break(f, start + part_size, file_size)
+            ranges.append((start, end))
+            start = end
+    
+    return ranges
+
+
+def _chunked(items: Iterable, chunk_size: int) -> Iterator[List]:
+    """Split an iterable into lists of at most chunk_size items."""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Pre-tokenizer: words and punctuation runs with their leading space, and
+# whitespace runs (a run followed by a word leaves its last space to it).
+# The pieces always add up to the original text.
+_PRE_TOKENIZE_PATTERN = re.compile(r" ?\w+| ?[^\s\w]+|\s+(?!\S)|\s+")
+
+# A whitespace run holding a newline, right after a non-space character:
+# the pre-tokenizer always starts a new piece there, so texts can be
+# split at its start safely
+_SAFE_LINE_BREAK = re.compile(r'(?<=\S)\s*\n')
+
+# Any whitespace right after a non-space character (see iter_safe_chunks)
+_SAFE_CUT = re.compile(r'(?<=\S)\s')
+
+# Case-folding policies of PreTokenizer
+CASE_POLICIES = (None, 'lower', 'casefold')
+
+
+class PreTokenizer:
+    """
+    Splits text into the words that BPE works on.
+    
+    Holds a compiled pattern and a case-folding policy, and is shared by
+    training (count_words) and encoding (iter_words / iter_matches) so the
+    two always see the same words. Nothing copies the input: matches are
+    found in place with finditer (or findall between pos/endpos bounds),
+    and case folding is applied per word, never to a copy of the text;
+    when counting, only the distinct words are folded.
+    
+    The default pattern is lossless: the words add up to the text, so
+    decode(encode(text)) == text. A custom pattern must have no capturing
+    groups and must never match across a non-space -> whitespace boundary
+    (streaming and parallel counting cut the text there). Case folding and
+    patterns that skip characters make encoding lossy.
+    """
+    
+    def __init__(self, pattern: Union[str, 're.Pattern'] = _PRE_TOKENIZE_PATTERN,
+                 case: Optional[str] = None, chunk_chars: int = 1 << 20):
+        """
+        Initialize the pre-tokenizer.
+        
+        Args:
+            pattern: Regular expression matching one word (string or compiled)
+            case: Case-folding policy: None, 'lower' or 'casefold'
+            chunk_chars: Size of the pieces count_words scans at a time,
+                bounding the memory used for long texts
+        """
+        self.pattern = re.compile(pattern) if isinstance(pattern, str) else pattern
+        if self.pattern.groups:
+            raise ValueError("Pre-tokenizer pattern must not have capturing groups")
+        if case not in CASE_POLICIES:
+            raise ValueError(f"Unknown case policy: {case!r} (expected one of {CASE_POLICIES})")
+        self.case = case
+        self.chunk_chars = chunk_chars
+    
+    def _fold(self) -> Optional[Callable[[str], str]]:
+        """Return the case-folding function, or None."""
+        if self.case == 'lower':
+            return str.lower
+        if self.case == 'casefold':
+            return str.casefold
+        return None
+    
+    def split(self, text: str) -> List[str]:
+        """
+        Split a text into its (case-folded) words.
+        
+        Builds the word list in one findall call, which is faster than
+        iter_words when every word is needed anyway (e.g. short texts).
+        
+        Args:
+            text: Input text
+            
+        Returns:
+            Words in text order
+        """
+        words = self.pattern.findall(text)
+        fold = self._fold()
+        return list(map(fold, words)) if fold else words
+    
+    def iter_words(self, text: str) -> Iterator[str]:
+        """
+        Lazily yield the (case-folded) words of a text.
+        
+        Args:
+            text: Input text
+            
+        Yields:
+            Words in text order
+        """
+        fold = self._fold()
+        if fold is None:
+            for match in self.pattern.finditer(text):
+                yield match.group()
+        else:
+            for match in self.pattern.finditer(text):
+                yield fold(match.group())
+    
+    def iter_matches(self, text: str) -> Iterator[Tuple[str, int, int]]:
+        """
+        Lazily yield every word with its span in the text.
+        
+        Args:
+            text: Input text
+            
+        Yields:
+            Tuples (case-folded word, start, end); the span refers to the
+            original text, which may differ in length from a folded word
+        """
+        fold = self._fold()
+        for match in self.pattern.finditer(text):
+            word = match.group()
+            yield (fold(word) if fold else word), match.start(), match.end()
+    
+    def count_words(self, text: str) -> Counter:
+        """
+        Count the words of a text.
+        
+        The text is scanned in pieces of about chunk_chars characters
+        (findall between pos/endpos, cut at safe points, no slicing), so
+        the temporary word list stays small however long the text is.
+        
+        Args:
+            text: Input text
+            
+        Returns:
+            Counter of (case-folded) words, in first-occurrence order
+        """
+        counts = Counter()
+        findall = self.pattern.findall
+        start = 0
+        
+        while start < len(text):
+            cut = _SAFE_CUT.search(text, start + self.chunk_chars)
+            end = cut.start() if cut else len(text)
+            counts.update(findall(text, start, end))
+            start = end
+        
+        fold = self._fold()
+        if fold is None:
+            return counts
+        
+        # Fold each distinct word once instead of lowercasing the whole text
+        folded = Counter()
+        for word, count in counts.items():
+            folded[fold(word)] += count
+        return folded
+    
+    def to_dict(self) -> Dict:
+        """
+        Describe the pre-tokenizer for saving.
+        
+        Returns:
+            Dictionary with the pattern source, its regex flags and the
+            case policy (see from_dict)
+        """
+        return {'pattern': self.pattern.pattern, 'flags': self.pattern.flags, 'case': self.case}
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'PreTokenizer':
+        """
+        Rebuild a pre-tokenizer described by to_dict().
+        
+        Args:
+            data: Dictionary returned by to_dict()
+            
+        Returns:
+            The pre-tokenizer
+        """
+        return cls(re.compile(data['pattern'], data['flags']), case=data['case'])
+    
+    def __repr__(self) -> str:
+        return f"PreTokenizer(pattern={self.pattern.pattern!r}, case={self.case!r})"
+
+
+def to_byte_string(text: str) -> str:
+    """Represent text as a string with one character per UTF-8 byte."""
+    return text.encode('utf-8').decode('latin-1')
+
+
+def from_byte_string(byte_string: str) -> str:
+    """Turn a byte string back into text (invalid UTF-8 becomes U+FFFD)."""
+    return byte_string.encode('latin-1').decode('utf-8', errors='replace')
+
+
+def iter_safe_chunks(blocks: Iterable[str]) -> Iterator[str]:
+    """
+    Re-cut a stream of text blocks so every piece can be tokenized on its own.
+    
+    Pieces are cut between a non-space character and a whitespace
+    character, where the pre-tokenizer always starts a new piece; the text
+    after the last such cut in a block is carried over to the next block.
+    
+    Args:
+        blocks: Consecutive blocks of a text (e.g. successive file reads)
+        
+    Yields:
+        Consecutive pieces of the text
+    """
+    carry = ''
+    
+    for block in blocks:
+        # The carried text contains no safe cut, only look after it
+        start = max(len(carry), 1)
+        block = carry + block
+        
+        # Hold back everything after the last safe cut
+        cut = len(block) - 1
+        while cut >= start and not (block[cut].isspace() and not block[cut - 1].isspace()):
+            cut -= 1
+        
+        if cut < start:
+            carry = block
+            continue
+        
+        carry = block[cut:]
+        yield block[:cut]
+    
+    if carry:
+        yield carry
+
+
+def read_text_chunks(path: str, chunk_chars: int = 1 << 20,
+                     encoding: str = 'utf-8') -> Iterator[str]:
+    """
+    Read a text file in chunks of about chunk_chars characters.
+    
+    Chunks are cut at safe points (see iter_safe_chunks), so every chunk
+    can be tokenized on its own.
+    
+    Args:
+        path: Path of the text file
+        chunk_chars: Number of characters read at a time
+        encoding: Text encoding of the file
+        
+    Yields:
+        Consecutive pieces of the file
+    """
+    with open(path, 'r', encoding=encoding) as f:
+        yield from iter_safe_chunks(iter(lambda: f.read(chunk_chars), ''))
+
+
+def remap_embeddings(weight, remap: Dict[int, int]):
+    """
+    Shrink an embedding (or output) matrix after BPETokenizer.prune.
+    
+    Args:
+        weight: Matrix with one row per old token ID (NumPy array or tensor)
+        remap: Old ID -> new ID mapping returned by prune
+        
+    Returns:
+        Matrix with one row per new token ID
+    """
+    old_ids = sorted(remap, key=remap.get)
+    return weight[old_ids]
+
+
+def merge_symbol_pair(symbols: List[str], pair: Tuple[str, str]) -> List[str]:
+    """
+    Replace every occurrence of a symbol pair with the merged symbol.
+    
+    Occurrences are merged left to right without overlap, so merging
+    ('a', 'a') in ['a', 'a', 'a'] gives ['aa', 'a'].
+    
+    Args:
+        symbols: Current symbols of a word
+        pair: The pair to merge
+        
+    Returns:
+        New list of symbols
+    """
+    left, right = pair
+    merged = left + right
+    new_symbols = []
+    i = 0
+    
+    while i < len(symbols):
+        if i < len(symbols) - 1 and symbols[i] == left and symbols[i + 1] == right:
+            new_symbols.append(merged)
+            i += 2
+        else:
+            new_symbols.append(symbols[i])
+            i += 1
+    
+    return new_symbols
+
+
+class BPETrainer:
+    """
+    Incremental BPE merge engine.
+    
+    Instead of recounting every pair after each merge, the trainer keeps:
+    
+    - pair_counts: pair -> total frequency over all words
+    - pair_words: pair -> indices of the words that contain it
+    - a max-heap of (count, first occurrence, pair) candidates
+    
+    A merge only rewrites the words listed in pair_words[pair] and adjusts
+    the counts of the pairs around them, so one merge costs
+    O(words containing the pair) instead of O(corpus).
+    
+    The heap uses lazy deletion: outdated entries stay in the heap and are
+    skipped (or re-pushed with fresh data) when they reach the top.
+    
+    Ties are broken exactly like max() over the recounted pair dictionary:
+    among equally frequent pairs, the one that occurs first (earliest word,
+    then earliest position in that word) wins. This keeps the learned merges
+    identical to the reference _get_pair_frequencies/_merge_vocab loop.
+    """
+    
+    def __init__(self, word_freqs: Dict[str, int],
+                 word_symbols: Optional[Dict[str, List[str]]] = None):
+        """
+        Initialize the trainer from word frequencies.
+        
+        Args:
+            word_freqs: Dictionary mapping words to frequencies (in first
+                occurrence order)
+            word_symbols: Optional initial segmentation of each word;
+                words are split into characters by default
+        """
+        self.words = []  # word index -> current list of symbols
+        self.freqs = []  # word index -> frequency
+        for word, freq in word_freqs.items():
+            symbols = word_symbols.get(word) if word_symbols else None
+            self.words.append(list(symbols) if symbols is not None else list(word))
+            self.freqs.append(freq)
+        
+        self.pair_counts = defaultdict(int)
+        self.pair_words = defaultdict(set)
+        self.pair_keys = {}  # pair -> (word index, char offset) of first occurrence
+        
+        for word_idx, symbols in enumerate(self.words):
+            offset = 0
+            for left, right in zip(symbols, symbols[1:]):
+                pair = (left, right)
+                self.pair_counts[pair] += self.freqs[word_idx]
+                self.pair_words[pair].add(word_idx)
+                self.pair_keys.setdefault(pair, (word_idx, offset))
+                offset += len(left)
+        
+        # heapq is a min-heap, so counts are stored negated
+        self.heap = [(-count, *self.pair_keys[pair], pair)
+                     for pair, count in self.pair_counts.items()]
+        heapq.heapify(self.heap)
+    
+    def _first_occurrence(self, pair: Tuple[str, str]) -> Tuple[int, int]:
+        """Find the (word index, char offset) where a pair first occurs."""
+        word_idx = min(self.pair_words[pair])
+        symbols = self.words[word_idx]
+        offset = 0
+        
+        for left, right in zip(symbols, symbols[1:]):
+            if (left, right) == pair:
+                break
+            offset += len(left)
+        
+        return word_idx, offset
+    
+    def best_pair(self) -> Optional[Tuple[str, str]]:
+        """
+        Return the most frequent pair, or None if no pairs are left.
+        
+        Returns:
+            The pair the next merge should use
+        """
+        while self.heap:
+            neg_count, word_idx, offset, pair = self.heap[0]
+            count = self.pair_counts.get(pair, 0)
+            
+            # Outdated entry: the count changed and a newer entry was pushed
+            if count <= 0 or -neg_count != count:
+                heapq.heappop(self.heap)
+                continue
+            
+            # The count is right, but occurrences may have disappeared,
+            # moving the first occurrence (the tie-breaker) further back
+            key = self._first_occurrence(pair)
+            if key != (word_idx, offset):
+                heapq.heapreplace(self.heap, (neg_count, *key, pair))
+                self.pair_keys[pair] = key
+                continue
+            
+            return pair
+        
+        return None
+    
+    def merge(self, pair: Tuple[str, str]) -> int:
+        """
+        Apply a merge to every word containing the pair.
+        
+        Args:
+            pair: The pair to merge
+            
+        Returns:
+            Number of words that were rewritten
+        """
+        merged = pair[0] + pair[1]
+        changed = {}  # pair -> True if it may have gained occurrences
+        affected = self.pair_words.pop(pair, set())
+        
+        for word_idx in affected:
+            symbols = self.words[word_idx]
+            new_symbols = merge_symbol_pair(symbols, pair)
+            self.words[word_idx] = new_symbols
+            freq = self.freqs[word_idx]
+            
+            before = Counter(zip(symbols, symbols[1:]))
+            after = Counter(zip(new_symbols, new_symbols[1:]))
+            
+            for other in before.keys() | after.keys():
+                delta = after[other] - before[other]
+                gained = other in after and merged in other
+                if delta:
+                    self.pair_counts[other] += delta * freq
+                if not delta and not gained:
+                    continue
+                
+                changed[other] = changed.get(other, False) or gained
+                if other not in after:
+                    self.pair_words[other].discard(word_idx)
+                elif other not in before:
+                    self.pair_words[other].add(word_idx)
+        
+        for other, gained in changed.items():
+            count = self.pair_counts[other]
+            if count <= 0:
+                del self.pair_counts[other]
+                self.pair_words.pop(other, None)
+                self.pair_keys.pop(other, None)
+                continue
+            
+            # Losing occurrences can only move the first occurrence back, so
+            # the old key is still an optimistic bound; new occurrences next
+            # to the merged symbol need the exact position.
+            if gained or other not in self.pair_keys:
+                self.pair_keys[other] = self._first_occurrence(other)
+            heapq.heappush(self.heap, (-count, *self.pair_keys[other], other))
+        
+        return len(affected)
+
+
+def load_or_train_tokenizer(training_text: str, vocab_size: int = 1000,
+                            cache_dir: Optional[str] = None, verbose: bool = True) -> BPETokenizer:
+    """
+    Train a tokenizer, reusing a saved copy from cache_dir when available.
+    
+    Saved tokenizers are keyed by a hash of the training text, the
+    vocabulary size and the file format version, so changing any of them
+    trains (and saves) a new tokenizer.
+    
+    Args:
+        training_text: Training text
+        vocab_size: Maximum vocabulary size for the tokenizer
+        cache_dir: Directory of saved tokenizers (None disables the disk
+            cache; defaults to the BPE_TOKENIZER_CACHE environment variable)
+        verbose: Print training progress (False for silent library use)
+    
+    Returns:
+        Trained BPE tokenizer
+    """
+    cache_dir = cache_dir or os.environ.get('BPE_TOKENIZER_CACHE')
+    if not cache_dir:
+        tokenizer = BPETokenizer(vocab_size=vocab_size, verbose=verbose)
+        tokenizer.train(training_text)
+        return tokenizer
+    
+    key = hashlib.sha256(
+        f"{_TOKENIZER_FORMAT_VERSION}:{vocab_size}:{training_text}".encode('utf-8')
+    ).hexdigest()[:20]
+    path = os.path.join(cache_dir, f"bpe-{key}.bin")
+    
+    if os.path.exists(path):
+        return BPETokenizer.load(path, verbose=verbose)
+    
+    tokenizer = BPETokenizer(vocab_size=vocab_size, verbose=verbose)
+    tokenizer.train(training_text)
+    
+    os.makedirs(cache_dir, exist_ok=True)
+    tokenizer.save(path)
+    
+    return tokenizer
+
+
+# Sample training text about AI and machine learning
+SAMPLE_TRAINING_TEXT = """
+    artificial intelligence is transforming the world through machine learning algorithms
+    neural networks learn patterns from data to make predictions and decisions
+    transformers are powerful architectures for natural language processing tasks
+    attention mechanisms help models focus on relevant parts of input sequences
+    large language models can generate human-like text and answer questions
+    deep learning requires computational resources and large datasets for training
+    backpropagation optimizes neural network weights through gradient descent
+    embeddings convert words into dense vector representations for processing
+    """
+
+# Base training text for common words and patterns
+DYNAMIC_BASE_TEXT = """
+    the and is are was were will be been being have has had do does did
+    can could would should might must may shall will would
+    I you he she it we they me him her us them my your his her its our their
+    this that these those a an some any all each every
+    in on at by for with from to of about through during before after
+    what when where why how who which whose whom
+    """
+
+# Process-wide tokenizers trained on fixed texts, keyed by vocab_size
+_sample_tokenizers: Dict[int, BPETokenizer] = {}
+_dynamic_base_tokenizers: Dict[int, BPETokenizer] = {}
+
+# Tokenizers adapted to user texts, keyed by a hash of the text and options
+_dynamic_tokenizers: OrderedDict = OrderedDict()
+_DYNAMIC_CACHE_SIZE = 32
+
+_tokenizer_registry_lock = threading.Lock()
+
+
+def _get_shared_tokenizer(registry: Dict[int, BPETokenizer], training_text: str,
+                          vocab_size: int, cache_dir: Optional[str],
+                          verbose: bool = True) -> BPETokenizer:
+    """Return the registry's tokenizer for vocab_size, training it on first use."""
+    tokenizer = registry.get(vocab_size)
+    if tokenizer is not None:
+        return tokenizer
+    
+    with _tokenizer_registry_lock:
+        # Another thread may have trained it while we waited
+        if vocab_size not in registry:
+            registry[vocab_size] = load_or_train_tokenizer(training_text, vocab_size, cache_dir,
+                                                           verbose)
+        
+        return registry[vocab_size]
+
+
+def create_sample_tokenizer(vocab_size: int = 1000, cache_dir: Optional[str] = None,
+                            verbose: bool = True) -> BPETokenizer:
+    """
+    Create a sample tokenizer trained on educational text.
+    
+    The training text never changes, so the tokenizer is trained once per
+    vocab_size and process, and the same instance is returned afterwards.
+    Treat it as read-only: retraining it would affect every caller.
+    
+    Args:
+        vocab_size: Maximum vocabulary size for the tokenizer
+        cache_dir: Optional directory where the trained tokenizer is saved
+            and reused across processes (see load_or_train_tokenizer)
+        verbose: Print training progress when the tokenizer is first trained
+    
+    Returns:
+        Trained BPE tokenizer
+    """
+    return _get_shared_tokenizer(_sample_tokenizers, SAMPLE_TRAINING_TEXT, vocab_size, cache_dir,
+                                 verbose)
+
+
+def create_dynamic_tokenizer(user_text: str, vocab_size: int = 1000,
+                             incremental: bool = False, verbose: bool = True) -> BPETokenizer:
+    """
+    Create a tokenizer that adapts to the user's input text.
+    
+    Results are cached by a hash of the user text, so repeating a prompt
+    returns the already trained tokenizer (treat it as read-only).
+    
+    Args:
+        user_text: The user's input text to include in training
+        vocab_size: Maximum vocabulary size for the tokenizer
+        incremental: Start from a tokenizer pre-trained on the base text and
+            only learn extra merges from the user text (see
+            BPETokenizer.adapt) instead of training from scratch
+        verbose: Print training progress (False for silent library use)
+    
+    Returns:
+        Trained BPE tokenizer adapted to the user's text
+    """
+    key = hashlib.sha256(f"{vocab_size}:{incremental}:{user_text}".encode('utf-8')).hexdigest()
+    
+    with _tokenizer_registry_lock:
+        tokenizer = _dynamic_tokenizers.get(key)
+        if tokenizer is not None:
+            _dynamic_tokenizers.move_to_end(key)
+            return tokenizer
+    
+    message = f"🚀 Training dynamic tokenizer for: '{user_text[:50]}{'...' if len(user_text) > 50 else ''}'"
+    
+    if incremental:
+        base_tokenizer = _get_shared_tokenizer(_dynamic_base_tokenizers, DYNAMIC_BASE_TEXT,
+                                               vocab_size, cache_dir=None, verbose=verbose)
+        tokenizer = copy.deepcopy(base_tokenizer)
+        tokenizer.verbose = verbose
+        tokenizer._log(message)
+        tokenizer.adapt(user_text)
+    else:
+        # Combine base text with user input (give more weight to user text)
+        combined_text = f"{DYNAMIC_BASE_TEXT} {user_text} {user_text} {user_text}"
+        
+        tokenizer = BPETokenizer(vocab_size=vocab_size, verbose=verbose)
+        tokenizer._log(message)
+        tokenizer.train(combined_text)
     
-    tokenizer = BPETokenizer(vocab_size=vocab_size)
-    tokenizer.train(combined_text)
+    with _tokenizer_registry_lock:
+        _dynamic_tokenizers[key] = tokenizer
+        if len(_dynamic_tokenizers) > _DYNAMIC_CACHE_SIZE:
+            _dynamic_tokenizers.popitem(last=False)
     
     return tokenizer
 
@@ -0,0 +1,471 @@
+"""
+Tokenizer server module for educational LLM project.
+
+This module serves one BPETokenizer to many local processes over a Unix
+socket or a loopback TCP port. Requests arriving concurrently are grouped
+into micro-batches: a batch is closed when it is full or when its oldest
+request has waited max_latency_ms, trading a bounded delay for fewer
+hand-offs to the encoding thread.
+
+Protocol: one JSON object per line in each direction.
+    {"id": 1, "op": "encode", "text": "hello"}      -> {"id": 1, "token_ids": [...]}
+    {"id": 2, "op": "decode", "token_ids": [...]}   -> {"id": 2, "text": "..."}
+    {"id": 3, "op": "metrics"}                      -> {"id": 3, "metrics": {...}}
+Failed requests get {"id": ..., "error": "..."}. Responses may arrive out
+of order; match them by id. Lines longer than max_line_bytes are skipped
+and answered with an error (carrying the id if the line starts with it).
+"""
+
+import re
+import time
+import json
+import asyncio
+import argparse
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Any
+
+from .tokenization import BPETokenizer, create_sample_tokenizer
+
+
+# Operations that go through the micro-batcher
+BATCHED_OPS = ('encode', 'decode')
+
+# Longest request or response line accepted (asyncio's default is 64 KiB)
+DEFAULT_MAX_LINE_BYTES = 16 << 20
+
+# Request id at the start of a message, recovered from oversized lines
+_LEADING_ID = re.compile(rb'\s*\{\s*"id"\s*:\s*(-?\d+)')
+
+
+async def read_message(reader: asyncio.StreamReader) -> Optional[Dict]:
+    """
+    Read one JSON-lines message.
+    
+    A line longer than the reader's limit is consumed and dropped without
+    buffering it; like a line that is not valid JSON, it is returned as
+    {"id": <leading id or None>, "error": "..."} so the connection stays
+    usable.
+    
+    Args:
+        reader: Stream reader created with the line limit
+        
+    Returns:
+        The decoded message, or None at the end of the stream
+    """
+    try:
+        line = await reader.readuntil(b'\n')
+    except asyncio.IncompleteReadError as e:
+        line = e.partial
+    except asyncio.LimitOverrunError as e:
+        head = await reader.readexactly(e.consumed)
+        match = _LEADING_ID.match(head)
+        size = len(head)
+        
+        # Skip the rest of the line
+        while True:
+            try:
+                size += len(await reader.readuntil(b'\n'))
+                break
+            except asyncio.IncompleteReadError as e:
+                size += len(e.partial)
+                break
+            except asyncio.LimitOverrunError as e:
+                size += len(await reader.readexactly(e.consumed))
+        
+        return {'id': int(match.group(1)) if match else None,
+                'error': f"Line of {size} bytes exceeds the limit"}
+    
+    if not line:
+        return None
+    
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        match = _LEADING_ID.match(line)
+        return {'id': int(match.group(1)) if match else None, 'error': f"Invalid JSON: {e}"}
+
+
+def _check_loopback(host: str) -> None:
+    """Refuse to listen on anything but a loopback address."""
+    if host == 'localhost':
+        return
+    try:
+        loopback = ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        loopback = False
+    if not loopback:
+        raise ValueError(f"Tokenizer server only listens on loopback addresses, got {host!r}")
+
+
+class TokenizerServer:
+    """
+    Asyncio tokenization server with deadline-based micro-batching.
+
+    Batches run one at a time on a dedicated thread, so the event loop
+    keeps accepting requests while a batch is encoded and the tokenizer
+    (and its word cache) is only ever used from one thread.
+    """
+
+    def __init__(self, tokenizer: BPETokenizer, max_batch_size: int = 64,
+                 max_latency_ms: float = 5.0, max_line_bytes: int = DEFAULT_MAX_LINE_BYTES):
+        """
+        Initialize the server.
+
+        Args:
+            tokenizer: Tokenizer to serve
+            max_batch_size: Maximum number of requests per batch
+            max_latency_ms: Maximum time a request waits for its batch to fill
+            max_line_bytes: Longest request line accepted
+        """
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.max_line_bytes = max_line_bytes
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._batch_task: Optional[asyncio.Task] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+        # Metrics
+        self.start_time = time.perf_counter()
+        self.requests_total = 0
+        self.errors_total = 0
+        self.batches_total = 0
+        self.tokens_total = 0
+        self.max_queue_depth = 0
+
+    async def start(self, path: Optional[str] = None, host: str = '127.0.0.1',
+                    port: int = 0) -> str:
+        """
+        Start listening and batching.
+
+        Args:
+            path: Unix socket path (if given, host and port are ignored)
+            host: Loopback address for TCP (other addresses are rejected)
+            port: TCP port (0 picks a free port)
+
+        Returns:
+            Address the server listens on ('unix:<path>' or 'host:port')
+        """
+        if path is None:
+            _check_loopback(host)
+
+        self._queue = asyncio.Queue()
+        self._batch_task = asyncio.create_task(self._batch_loop())
+        self.start_time = time.perf_counter()
+
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle_connection, path=path,
+                                                           limit=self.max_line_bytes)
+            return f"unix:{path}"
+
+        self._server = await asyncio.start_server(self._handle_connection, host=host, port=port,
+                                                  limit=self.max_line_bytes)
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"{host}:{port}"
+
+    async def close(self) -> None:
+        """Stop accepting connections and stop the batcher."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._batch_task is not None:
+            self._batch_task.cancel()
+            try:
+                await self._batch_task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, op: str, payload: Any) -> Any:
+        """
+        Queue one request and wait for its result.
+
+        Args:
+            op: 'encode' (payload: text) or 'decode' (payload: token IDs)
+            payload: Request payload
+
+        Returns:
+            Token IDs for 'encode', text for 'decode'
+        """
+        if op not in BATCHED_OPS:
+            raise ValueError(f"Unknown operation: {op!r} (expected one of {BATCHED_OPS})")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, payload, future))
+        self.requests_total += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+
+        return await future
+
+    async def _batch_loop(self) -> None:
+        """Collect requests into batches and run them on the worker thread."""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            # The first request opens the batch and starts its deadline
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_latency
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            requests = [(op, payload) for op, payload, _ in batch]
+            results = await loop.run_in_executor(self._executor, self._run_batch, requests)
+            self.batches_total += 1
+
+            for (_, _, future), (ok, value) in zip(batch, results):
+                if future.cancelled():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    self.errors_total += 1
+                    future.set_exception(value)
+
+    def _run_batch(self, requests: List[Tuple[str, Any]]) -> List[Tuple[bool, Any]]:
+        """
+        Run a batch of requests on the worker thread.
+
+        Args:
+            requests: List of (op, payload)
+
+        Returns:
+            One (success, result or exception) per request
+        """
+        results = []
+        for op, payload in requests:
+            try:
+                if op == 'encode':
+                    token_ids = self.tokenizer.encode(payload)
+                    self.tokens_total += len(token_ids)
+                    results.append((True, token_ids))
+                else:
+                    self.tokens_total += len(payload)
+                    results.append((True, self.tokenizer.decode(payload)))
+            except Exception as e:
+                results.append((False, e))
+        return results
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        """Serve one client: every request line is handled concurrently."""
+        tasks = set()
+
+        async def respond(message: Dict) -> None:
+            request_id = message.get('id')
+            try:
+                op = message.get('op')
+                if 'error' in message:
+                    raise ValueError(message['error'])
+                elif op == 'metrics':
+                    response = {'id': request_id, 'metrics': self.get_metrics()}
+                elif op == 'encode':
+                    response = {'id': request_id,
+                                'token_ids': await self.submit(op, message['text'])}
+                elif op == 'decode':
+                    response = {'id': request_id,
+                                'text': await self.submit(op, message['token_ids'])}
+                else:
+                    raise ValueError(f"Unknown operation: {op!r}")
+            except Exception as e:
+                response = {'id': request_id, 'error': f"{type(e).__name__}: {e}"}
+
+            writer.write((json.dumps(response) + '\n').encode('utf-8'))
+            await writer.drain()
+
+        try:
+            while True:
+                message = await read_message(reader)
+                if message is None:
+                    break
+                task = asyncio.create_task(respond(message))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    def get_metrics(self) -> Dict:
+        """
+        Get throughput and queue metrics.
+
+        Returns:
+            Dictionary with request, batch and token counters and rates
+        """
+        uptime = time.perf_counter() - self.start_time
+        return {
+            'uptime_sec': uptime,
+            'requests_total': self.requests_total,
+            'errors_total': self.errors_total,
+            'batches_total': self.batches_total,
+            'tokens_total': self.tokens_total,
+            'mean_batch_size': self.requests_total / self.batches_total if self.batches_total else 0.0,
+            'requests_per_sec': self.requests_total / uptime if uptime else 0.0,
+            'tokens_per_sec': self.tokens_total / uptime if uptime else 0.0,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'max_queue_depth': self.max_queue_depth
+        }
+
+
+class TokenizerClient:
+    """
+    Asyncio client for TokenizerServer.
+
+    Many requests can be in flight on one connection; responses are
+    matched to requests by id.
+    """
+
+    def __init__(self, max_line_bytes: int = DEFAULT_MAX_LINE_BYTES):
+        """
+        Initialize the client.
+
+        Args:
+            max_line_bytes: Longest response line accepted
+        """
+        self.max_line_bytes = max_line_bytes
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._reader_task: Optional[asyncio.Task] = None
+
+    async def connect(self, address: str) -> None:
+        """
+        Connect to a server.
+
+        Args:
+            address: 'unix:<path>' or 'host:port', as returned by
+                TokenizerServer.start
+        """
+        if address.startswith('unix:'):
+            self._reader, self._writer = await asyncio.open_unix_connection(
+                address[len('unix:'):], limit=self.max_line_bytes)
+        else:
+            host, port = address.rsplit(':', 1)
+            self._reader, self._writer = await asyncio.open_connection(
+                host, int(port), limit=self.max_line_bytes)
+        self._reader_task = asyncio.create_task(self._read_responses())
+
+    async def close(self) -> None:
+        """Close the connection."""
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+
+    async def _read_responses(self) -> None:
+        """Resolve pending requests as their responses arrive."""
+        try:
+            while True:
+                response = await read_message(self._reader)
+                if response is None:
+                    break
+                future = self._pending.pop(response.get('id'), None)
+                if future is None or future.done():
+                    continue
+                if 'error' in response:
+                    future.set_exception(RuntimeError(response['error']))
+                else:
+                    future.set_result(response)
+        finally:
+            # Connection closed (or reading failed): fail whatever is still waiting
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Tokenizer server closed the connection"))
+            self._pending.clear()
+
+    async def _request(self, message: Dict) -> Dict:
+        """Send one request and wait for its response."""
+        if self._reader_task is None or self._reader_task.done():
+            raise ConnectionError("Tokenizer client is not connected")
+
+        request_id = self._next_id
+        self._next_id += 1
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+
+        # The id goes first so that an oversized line can still be answered
+        message = {'id': request_id, **message}
+        self._writer.write((json.dumps(message) + '\n').encode('utf-8'))
+        await self._writer.drain()
+
+        return await future
+
+    async def encode(self, text: str) -> List[int]:
+        """Encode text on the server."""
+        return (await self._request({'op': 'encode', 'text': text}))['token_ids']
+
+    async def decode(self, token_ids: List[int]) -> str:
+        """Decode token IDs on the server."""
+        return (await self._request({'op': 'decode', 'token_ids': list(token_ids)}))['text']
+
+    async def metrics(self) -> Dict:
+        """Get the server metrics."""
+        return (await self._request({'op': 'metrics'}))['metrics']
+
+
+async def serve(tokenizer: BPETokenizer, path: Optional[str] = None, host: str = '127.0.0.1',
+                port: int = 0, max_batch_size: int = 64, max_latency_ms: float = 5.0) -> None:
+    """
+    Run a tokenizer server until cancelled.
+
+    Args:
+        tokenizer: Tokenizer to serve
+        path: Unix socket path (TCP on host:port if None)
+        host: Loopback address for TCP (other addresses are rejected)
+        port: TCP port
+        max_batch_size: Maximum number of requests per batch
+        max_latency_ms: Maximum time a request waits for its batch to fill
+    """
+    server = TokenizerServer(tokenizer, max_batch_size, max_latency_ms)
+    address = await server.start(path=path, host=host, port=port)
+    print(f"🛰️ Tokenizer server listening on {address}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def main():
+    """Run the server from the command line."""
+    parser = argparse.ArgumentParser(description="Serve a BPE tokenizer to local processes")
+    parser.add_argument('--tokenizer', help="Saved tokenizer file (defaults to the sample tokenizer)")
+    parser.add_argument('--socket', help="Unix socket path (TCP on --host/--port if omitted)")
+    parser.add_argument('--host', default='127.0.0.1', help="Loopback address for TCP")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--max-latency-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    if args.tokenizer:
+        tokenizer = BPETokenizer.load(args.tokenizer)
+    else:
+        tokenizer = create_sample_tokenizer()
+
+    try:
+        asyncio.run(serve(tokenizer, args.socket, args.host, args.port,
+                          args.max_batch_size, args.max_latency_ms))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
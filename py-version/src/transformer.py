@@ -187,26 +187,34 @@ class GPTTransformer(nn.Module):
     
     def forward(self, 
                 token_ids: torch.Tensor,
-                return_attention: bool = False) -> Dict:
+                return_attention: bool = False,
+                attention_mask: Optional[torch.Tensor] = None,
+                position_ids: Optional[torch.Tensor] = None) -> Dict:
         """
         Forward pass through the transformer.
         
         Args:
             token_ids: Token IDs of shape (batch_size, seq_len)
             return_attention: Whether to return attention weights
+            attention_mask: Optional mask of shape (batch_size, seq_len, seq_len);
+                position i may attend to position j where the mask is nonzero
+            position_ids: Optional positions of shape (batch_size, seq_len)
             
         Returns:
             Dictionary with outputs and optional attention weights
         """
         # Step 1: Embedding
-        x = self.embedding(token_ids)
+        x = self.embedding(token_ids, position_ids)
+        
+        # Broadcast the mask over the attention heads
+        mask = attention_mask.unsqueeze(1) if attention_mask is not None else None
         
         # Step 2: Apply transformer blocks
         attention_weights = []
         layer_outputs = []
         
         for i, block in enumerate(self.transformer_blocks):
-            x, attn_weights = block(x)
+            x, attn_weights = block(x, mask)
             
             if return_attention:
                 attention_weights.append(attn_weights)
@@ -18,12 +18,19 @@ def test_tokenization():
     try:
         from tokenization import BPETokenizer, create_sample_tokenizer
         
-        # Create a simple tokenizer
-        tokenizer = BPETokenizer(vocab_size=100)
+        # Create a simple tokenizer (260 IDs are taken by special and byte tokens)
+        tokenizer = BPETokenizer(vocab_size=300)
         
         # Simple training text
         training_text = "hello world this is a test hello world test"
         tokenizer.train(training_text)
+        assert tokenizer.merges
+        
+        try:
+            BPETokenizer(vocab_size=100).train(training_text)
+            assert False, "a vocab_size without room for merges should be rejected"
+        except ValueError:
+            pass
         
         # Test encoding
         test_text = "hello test"
@@ -42,6 +49,978 @@ def test_tokenization():
         return False
 
 
+def test_incremental_bpe_training():
+    """Test that incremental BPE training matches the reference merge loop."""
+    print("🔁 Testing Incremental BPE Training...")
+    
+    try:
+        from tokenization import BPETokenizer, to_byte_string
+        
+        training_text = "low lower lowest newer newest wider aaa aaaa banana bandana"
+        
+        # Reference: recount every pair after each merge
+        reference = BPETokenizer(vocab_size=400)
+        word_freqs = {tuple(to_byte_string(word)): freq
+                      for word, freq in reference._get_word_frequencies(training_text).items()}
+        expected_merges = []
+        while True:
+            pair_freqs = reference._get_pair_frequencies(word_freqs)
+            if not pair_freqs:
+                break
+            best_pair = max(pair_freqs, key=pair_freqs.get)
+            expected_merges.append(best_pair)
+            word_freqs = reference._merge_vocab(best_pair, word_freqs)
+        
+        tokenizer = BPETokenizer(vocab_size=400)
+        tokenizer.train(training_text)
+        
+        assert tokenizer.merges == expected_merges
+        print(f"   Merges learned: {len(tokenizer.merges)}")
+        print("   ✅ Incremental training matches reference!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Incremental training failed: {e}")
+        return False
+
+
+def test_rank_based_encoding():
+    """Test that the rank-based encoder matches replaying every merge."""
+    print("🏷️ Testing Rank-Based Encoding...")
+    
+    try:
+        from tokenization import create_sample_tokenizer
+        
+        tokenizer = create_sample_tokenizer(vocab_size=400)
+        
+        words = ["transformers", "attention", "aaaa", "banana", "xyz", "learning"]
+        for word in words:
+            assert tokenizer._encode_word(word) == tokenizer._encode_word_sequential(word), word
+        
+        print(f"   Checked {len(words)} words against {len(tokenizer.merges)} merges")
+        print("   ✅ Rank-based encoding matches!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Rank-based encoding failed: {e}")
+        return False
+
+
+def test_word_cache():
+    """Test the LRU word cache and its invalidation on retraining."""
+    print("🗃️ Testing Word Cache...")
+    
+    try:
+        from tokenization import BPETokenizer
+        
+        tokenizer = BPETokenizer(vocab_size=400, cache_size=2)
+        tokenizer.train("hello world this is a test hello world test")
+        
+        first = tokenizer.encode("hello world hello world")
+        cache_info = tokenizer.get_vocab_info()['word_cache']
+        assert cache_info['hits'] == 1 and cache_info['misses'] == 3
+        assert cache_info['size'] == 2
+        assert tokenizer.encode("hello world hello world") == first
+        
+        tokenizer.train("zebra zebra")
+        assert tokenizer.get_vocab_info()['word_cache']['size'] == 0
+        
+        print(f"   Cache stats: {tokenizer.get_vocab_info()['word_cache']}")
+        print("   ✅ Word cache working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Word cache failed: {e}")
+        return False
+
+
+def test_batch_encoding():
+    """Test process-pool batch encoding against single-text encoding."""
+    print("📦 Testing Batch Encoding...")
+    
+    try:
+        from tokenization import BPETokenizer
+        
+        tokenizer = BPETokenizer(vocab_size=400)
+        tokenizer.train("hello world this is a test hello world test")
+        
+        texts = ["hello test", "world", "", "this is a hello world"] * 10
+        expected = [tokenizer.encode(text) for text in texts]
+        
+        assert tokenizer.encode_batch(texts, num_workers=2, chunk_size=3) == expected
+        assert list(tokenizer.iter_encode_batch(iter(texts), num_workers=1)) == expected
+        
+        print(f"   Encoded {len(texts)} texts in order")
+        print("   ✅ Batch encoding working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Batch encoding failed: {e}")
+        return False
+
+
+def test_streaming_training():
+    """Test that training from files matches training on the full text."""
+    print("🌊 Testing Streaming Training...")
+    
+    try:
+        import tempfile
+        from tokenization import BPETokenizer
+        
+        training_text = "hello world this is a test\nhello world test\nstreaming tokenizers"
+        
+        tokenizer = BPETokenizer(vocab_size=400)
+        tokenizer.train(training_text)
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "corpus.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(training_text)
+            
+            # Tiny chunks force words to straddle chunk boundaries
+            streamed = BPETokenizer(vocab_size=400)
+            streamed.train_from_files([path], chunk_chars=4)
+        
+        assert streamed.merges == tokenizer.merges
+        assert streamed.vocab == tokenizer.vocab
+        
+        print(f"   Merges learned: {len(streamed.merges)}")
+        print("   ✅ Streaming training working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Streaming training failed: {e}")
+        return False
+
+
+def test_parallel_word_counting():
+    """Test that parallel word counting matches the serial path."""
+    print("🧮 Testing Parallel Word Counting...")
+    
+    try:
+        from tokenization import BPETokenizer
+        
+        training_text = "\n".join(["hello world this is a test", "hello world test",
+                                   "parallel counting of words", "aaa bbb aaa"] * 25)
+        
+        serial = BPETokenizer(vocab_size=400)
+        serial.train(training_text)
+        
+        parallel = BPETokenizer(vocab_size=400)
+        parallel.train(training_text, num_workers=2)
+        
+        assert parallel.merges == serial.merges
+        assert parallel.vocab == serial.vocab
+        
+        # CRLF line endings and trailing spaces still split, and files
+        # counted in parallel match the serial (text mode) path
+        import tempfile
+        from tokenization import split_at_line_boundaries, line_aligned_byte_ranges
+        
+        assert len(split_at_line_boundaries('hello  \n' * 1000, 8)) >= 8
+        
+        crlf_text = "\r\n".join(["hello wörld this is a test ", "hello world test\t",
+                                  "parallel counting of words", "aaa bbb aaa"] * 25) + "\r\n"
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'crlf.txt')
+            with open(path, 'wb') as f:
+                f.write(crlf_text.encode('utf-8'))
+            
+            ranges = line_aligned_byte_ranges(path, 8)
+            assert len(ranges) >= 8
+            
+            serial_files = BPETokenizer(vocab_size=400, verbose=False)
+            serial_files.train_from_files([path])
+            parallel_files = BPETokenizer(vocab_size=400, verbose=False)
+            parallel_files.train_from_files([path], num_workers=2)
+        
+        assert parallel_files.merges == serial_files.merges
+        assert ('\r', '\n') not in parallel_files.merges
+        
+        print(f"   Merges learned: {len(parallel.merges)}")
+        print("   ✅ Parallel word counting working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Parallel word counting failed: {e}")
+        return False
+
+
+def test_tokenizer_serialization():
+    """Test binary save/load (with and without mmap) and JSON export."""
+    print("💾 Testing Tokenizer Serialization...")
+    
+    try:
+        import json
+        import tempfile
+        from tokenization import BPETokenizer
+        
+        tokenizer = BPETokenizer(vocab_size=400)
+        tokenizer.train("hello world this is a test hello world test")
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "tokenizer.bin")
+            tokenizer.save(path)
+            
+            for use_mmap in (True, False):
+                loaded = BPETokenizer.load(path, mmap=use_mmap)
+                assert loaded.vocab == tokenizer.vocab
+                assert loaded.merges == tokenizer.merges
+                assert loaded.special_tokens == tokenizer.special_tokens
+                assert loaded.encode("hello test") == tokenizer.encode("hello test")
+                del loaded
+            
+            json_path = os.path.join(tmp_dir, "tokenizer.json")
+            tokenizer.export_json(json_path)
+            with open(json_path, encoding="utf-8") as f:
+                assert len(json.load(f)["merges"]) == len(tokenizer.merges)
+        
+        print(f"   Round-tripped {len(tokenizer.vocab)} tokens")
+        print("   ✅ Serialization working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Serialization failed: {e}")
+        return False
+
+
+def test_cached_sample_tokenizer():
+    """Test the memoized sample tokenizer and the on-disk tokenizer cache."""
+    print("🧠 Testing Cached Sample Tokenizer...")
+    
+    try:
+        import tempfile
+        from tokenization import create_sample_tokenizer, load_or_train_tokenizer
+        
+        assert create_sample_tokenizer(vocab_size=300) is create_sample_tokenizer(vocab_size=300)
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            trained = load_or_train_tokenizer("hello world test", 300, cache_dir=tmp_dir)
+            assert len(os.listdir(tmp_dir)) == 1
+            cached = load_or_train_tokenizer("hello world test", 300, cache_dir=tmp_dir)
+            assert cached.merges == trained.merges
+            del cached
+        
+        print("   ✅ Cached sample tokenizer working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Cached sample tokenizer failed: {e}")
+        return False
+
+
+def test_incremental_adaptation():
+    """Test adapting a trained tokenizer to new text without retraining."""
+    print("🧩 Testing Incremental Adaptation...")
+    
+    try:
+        from tokenization import BPETokenizer, create_dynamic_tokenizer
+        
+        base = BPETokenizer(vocab_size=400)
+        base.train("the and is are was were will be been being have has had")
+        base_vocab = dict(base.vocab)
+        base_merges = list(base.merges)
+        
+        base.adapt("tokenizers tokenize tokens quickly")
+        
+        # Existing tokens and merges are kept, new ones are appended
+        assert all(base.vocab[token_id] == token for token_id, token in base_vocab.items())
+        assert base.merges[:len(base_merges)] == base_merges
+        assert len(base.merges) > len(base_merges)
+        assert '<UNK>' not in [base.vocab[t] for t in base.encode("tokenizers")]
+        
+        first = create_dynamic_tokenizer("adaptive tokenizers", vocab_size=300, incremental=True)
+        assert create_dynamic_tokenizer("adaptive tokenizers", vocab_size=300, incremental=True) is first
+        
+        print(f"   Merges: {len(base_merges)} base + {len(base.merges) - len(base_merges)} adapted")
+        print("   ✅ Incremental adaptation working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Incremental adaptation failed: {e}")
+        return False
+
+
+def test_byte_level_roundtrip():
+    """Test that byte-level encoding never loses text."""
+    print("🔡 Testing Byte-Level Round Trip...")
+    
+    try:
+        from tokenization import BPETokenizer
+        
+        tokenizer = BPETokenizer(vocab_size=400)
+        tokenizer.train("hello world this is a test hello world test")
+        
+        texts = ["Hello, World!  How's it going?\n", "naïve café 🎉", "\t  spaces  ", ""]
+        for text in texts:
+            token_ids = tokenizer.encode(text)
+            assert tokenizer.special_tokens['<UNK>'] not in token_ids
+            assert tokenizer.decode(token_ids) == text
+        
+        print(f"   Round-tripped {len(texts)} texts exactly")
+        print("   ✅ Byte-level round trip working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Byte-level round trip failed: {e}")
+        return False
+
+
+def test_longest_match_mode():
+    """Test the trie-based longest-match encoding mode."""
+    print("🌳 Testing Longest-Match Encoding...")
+    
+    try:
+        from tokenization import BPETokenizer
+        
+        tokenizer = BPETokenizer(vocab_size=400)
+        tokenizer.train("hello world this is a test hello world test")
+        
+        text = "hello test, wonderful world"
+        token_ids = tokenizer.encode(text, mode='longest_match')
+        assert tokenizer.decode(token_ids) == text
+        
+        report = tokenizer.compare_encoding_modes([text, "this is a test"])
+        assert report['words'] == 9
+        
+        print(f"   Disagreement rate: {report['word_disagreement_rate']:.2f}")
+        print("   ✅ Longest-match encoding working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Longest-match encoding failed: {e}")
+        return False
+
+
+def test_encode_to_array():
+    """Test encoding a batch straight into a padded NumPy array."""
+    print("🔢 Testing Array Encoding...")
+    
+    try:
+        from tokenization import BPETokenizer
+        
+        tokenizer = BPETokenizer(vocab_size=400)
+        tokenizer.train("hello world this is a test hello world test")
+        
+        texts = ["hello test", "this is a much longer hello world test", ""]
+        token_ids, lengths = tokenizer.encode_to_array(texts, max_len=6)
+        
+        assert token_ids.shape == (3, 6) and str(token_ids.dtype) == 'int32'
+        for row, text, length in zip(token_ids, texts, lengths):
+            assert list(row[:length]) == tokenizer.encode(text)[:6]
+            assert all(row[length:] == tokenizer.special_tokens['<PAD>'])
+        
+        print(f"   Batch shape: {token_ids.shape}, lengths: {lengths.tolist()}")
+        print("   ✅ Array encoding working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Array encoding failed: {e}")
+        return False
+
+
+def test_encode_offsets():
+    """Test character offsets returned by encode."""
+    print("📍 Testing Token Offsets...")
+    
+    try:
+        from tokenization import BPETokenizer
+        
+        tokenizer = BPETokenizer(vocab_size=400)
+        tokenizer.train("hello world this is a test hello world test")
+        
+        text = "hello, café world"
+        token_ids, offsets = tokenizer.encode(text, return_offsets=True)
+        
+        assert token_ids == tokenizer.encode(text)
+        assert len(offsets) == len(token_ids)
+        assert offsets[0] == (0, 0) and offsets[-1] == (len(text), len(text))
+        
+        # Spans cover the text in order (bytes of one character share a span)
+        spans = dict.fromkeys(offsets[1:-1])
+        assert "".join(text[start:end] for start, end in spans) == text
+        for token_id, (start, end) in zip(token_ids[1:-1], offsets[1:-1]):
+            if text[start:end].isascii():
+                assert tokenizer.token_text(token_id) == text[start:end]
+        
+        print(f"   Offsets: {offsets[1:4]}...")
+        print("   ✅ Token offsets working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Token offsets failed: {e}")
+        return False
+
+
+def test_columnar_visualization():
+    """Test the columnar tokenization result and its dictionary view."""
+    print("📊 Testing Columnar Visualization...")
+    
+    try:
+        from tokenization import BPETokenizer, TOKEN_TYPES
+        
+        tokenizer = BPETokenizer(vocab_size=400)
+        tokenizer.train("hello world this is a test hello world test")
+        
+        columns = tokenizer.visualize_tokenization("hello test")
+        token_ids = tokenizer.encode("hello test")
+        
+        assert columns.token_ids.tolist() == token_ids
+        assert len(columns) == len(token_ids)
+        assert columns[0] == {'position': 0, 'token_id': token_ids[0],
+                              'token_text': '<BOS>', 'token_type': 'special'}
+        assert [TOKEN_TYPES[code] for code in columns.token_types] == \
+            [info['token_type'] for info in columns]
+        
+        print(f"   Tokens: {columns.token_texts}")
+        print("   ✅ Columnar visualization working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Columnar visualization failed: {e}")
+        return False
+
+
+def test_token_dataset():
+    """Test the sharded token dataset and its memory-mapped windows."""
+    print("🗂️ Testing Token Dataset...")
+    
+    try:
+        import tempfile
+        import torch
+        from src.tokenization import BPETokenizer
+        from src.token_dataset import build_token_dataset, TokenWindowDataset
+        
+        tokenizer = BPETokenizer(vocab_size=400)
+        tokenizer.train("hello world this is a test hello world test")
+        
+        documents = ["hello world", "this is a test", "hello test world"] * 20
+        stream = [token_id for document in documents
+                  for token_id in tokenizer.encode(document)]
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            corpus_path = os.path.join(tmp_dir, 'corpus.txt')
+            with open(corpus_path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(documents) + '\n')
+            
+            out_dir = os.path.join(tmp_dir, 'dataset')
+            index = build_token_dataset([corpus_path], tokenizer, out_dir,
+                                        shard_size=100, num_workers=1)
+            
+            assert index['dtype'] == 'uint16'
+            assert index['num_documents'] == len(documents)
+            assert index['total_tokens'] == len(stream)
+            
+            dataset = TokenWindowDataset(out_dir, seq_len=16)
+            input_ids, target_ids = dataset[1]
+            
+            assert input_ids.dtype == torch.long
+            assert input_ids.tolist() == stream[16:32]
+            assert target_ids.tolist() == stream[17:33]
+            assert len(dataset) == sum((shard['num_tokens'] - 17) // 16 + 1
+                                       for shard in index['shards']
+                                       if shard['num_tokens'] >= 17)
+            
+            print(f"   Shards: {len(index['shards'])}, windows: {len(dataset)}")
+            del dataset, input_ids, target_ids
+        
+        print("   ✅ Token dataset working!")
+        
+        return True
+        
+    except ImportError:
+        print("   ⚠️ PyTorch not installed - token dataset not tested")
+        return False
+    except Exception as e:
+        print(f"   ❌ Token dataset failed: {e}")
+        return False
+
+
+def test_sequence_packing():
+    """Test packing variable-length sequences into isolated segments."""
+    print("📦 Testing Sequence Packing...")
+    
+    try:
+        from src.tokenization import BPETokenizer
+        from src.token_dataset import PackingCollator
+        
+        tokenizer = BPETokenizer(vocab_size=400)
+        tokenizer.train("hello world this is a test hello world test")
+        
+        sequences = [tokenizer.encode(text) for text in
+                     ["hello world this is a test"] + ["a", "hello", "test"] * 3]
+        collator = PackingCollator(tokenizer, max_seq_len=16)
+        batch = collator(sequences)
+        
+        num_tokens = sum(len(sequence) for sequence in sequences)
+        assert int((batch['segment_ids'] > 0).sum()) == num_tokens
+        assert batch['padding_ratio_after'] < batch['padding_ratio_before']
+        
+        # Every document starts at position 0 and sees only its own past
+        row = batch['segment_ids'][0]
+        first = (row == 1).nonzero().flatten()
+        mask = batch['attention_mask'][0]
+        assert batch['position_ids'][0, first].tolist() == list(range(len(first)))
+        assert bool(mask[first[-1], first].all())
+        assert not bool(mask[first[-1], row != 1].any())
+        assert not bool(mask[first[0], first[1:]].any())
+        assert int(batch['labels'][0, first[-1]]) == -100
+        
+        # Packed logits equal a causal run of each document on its own
+        import torch
+        from src.transformer import GPTTransformer
+        torch.manual_seed(0)
+        model = GPTTransformer(vocab_size=max(tokenizer.vocab) + 1, d_model=32, num_heads=2,
+                               num_layers=2, d_ff=64, max_seq_len=16, dropout=0.0).eval()
+        with torch.no_grad():
+            packed_logits = model(batch['input_ids'], attention_mask=batch['attention_mask'],
+                                  position_ids=batch['position_ids'])['logits']
+            document = batch['input_ids'][0:1, first]
+            causal = torch.tril(torch.ones(len(first), len(first), dtype=torch.bool)).unsqueeze(0)
+            alone_logits = model(document, attention_mask=causal)['logits']
+        assert torch.allclose(packed_logits[0, first], alone_logits[0], atol=1e-5)
+        
+        print(f"   Padding: {batch['padding_ratio_before']:.1%} -> {batch['padding_ratio_after']:.1%}")
+        print("   ✅ Sequence packing working!")
+        
+        return True
+        
+    except ImportError:
+        print("   ⚠️ PyTorch not installed - sequence packing not tested")
+        return False
+    except Exception as e:
+        print(f"   ❌ Sequence packing failed: {e}")
+        return False
+
+
+def test_benchmark_suite():
+    """Test the tokenizer benchmark and its baseline comparison."""
+    print("⏱️ Testing Benchmark Suite...")
+    
+    try:
+        import copy
+        from benchmark_tokenizer import run_benchmarks, compare_results
+        
+        current = run_benchmarks([300], [2000], num_workers=1, repeats=1)
+        result = current['results'][0]
+        
+        assert result['train']['merges'] > 0
+        assert result['encode']['tokens_per_sec'] > 0
+        assert compare_results(current, current) == []
+        
+        # A baseline twice as fast must be reported as a regression
+        baseline = copy.deepcopy(current)
+        baseline['results'][0]['decode']['tokens_per_sec'] *= 2
+        regressions = compare_results(current, baseline, threshold=0.1)
+        assert [(r['stage'], r['metric']) for r in regressions] == [('decode', 'tokens_per_sec')]
+        
+        print("   ✅ Benchmark suite working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Benchmark suite failed: {e}")
+        return False
+
+
+def test_streaming_encode():
+    """Test lazy encoding of long documents from text and files."""
+    print("🌊 Testing Streaming Encode...")
+    
+    try:
+        import tempfile
+        from pathlib import Path
+        from tokenization import BPETokenizer
+        
+        tokenizer = BPETokenizer(vocab_size=400)
+        tokenizer.train("hello world this is a test hello world test")
+        
+        text = "hello  world, this is a tést!\n\nhello test world  " * 20
+        expected = tokenizer.encode(text)
+        
+        assert list(tokenizer.iter_encode(text)) == expected
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'document.txt')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            
+            # Tiny chunks force words to straddle chunk boundaries
+            for chunk_chars in (1, 3, 17):
+                assert list(tokenizer.iter_encode(Path(path), chunk_chars=chunk_chars)) == expected
+            
+            with open(path, 'r', encoding='utf-8') as f:
+                assert list(tokenizer.iter_encode(f, chunk_chars=5)) == expected
+        
+        print(f"   Streamed {len(expected)} tokens")
+        print("   ✅ Streaming encode working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Streaming encode failed: {e}")
+        return False
+
+
+def test_batch_decoding():
+    """Test table-based decoding of lists and 2-D ID arrays."""
+    print("🔡 Testing Batch Decoding...")
+    
+    try:
+        from tokenization import BPETokenizer
+        
+        tokenizer = BPETokenizer(vocab_size=400)
+        tokenizer.train("hello world this is a test hello world test")
+        
+        texts = ["hello world", "a tést", "", "test test test"]
+        sequences = [tokenizer.encode(text) for text in texts]
+        
+        assert tokenizer.decode_batch(sequences) == texts
+        
+        # Padded array from encode_to_array: padding must not leak into the text
+        token_array, _ = tokenizer.encode_to_array(texts, max_len=16)
+        assert tokenizer.decode_batch(token_array) == texts
+        
+        # Unknown and negative IDs are skipped
+        assert tokenizer.decode([-1, 10 ** 6] + sequences[0]) == "hello world"
+        
+        # Iterators are decoded too, e.g. straight from iter_encode
+        assert tokenizer.decode(tokenizer.iter_encode("hello world")) == "hello world"
+        assert tokenizer.decode(iter(sequences[1])) == texts[1]
+        
+        try:
+            import torch
+            assert tokenizer.decode_batch(torch.as_tensor(token_array)) == texts
+        except ImportError:
+            pass
+        
+        print("   ✅ Batch decoding working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Batch decoding failed: {e}")
+        return False
+
+
+def test_tokenizer_server():
+    """Test the micro-batching tokenizer server with concurrent clients."""
+    print("🛰️ Testing Tokenizer Server...")
+    
+    try:
+        import asyncio
+        from src.tokenization import BPETokenizer
+        from src.tokenizer_server import TokenizerServer, TokenizerClient
+        
+        tokenizer = BPETokenizer(vocab_size=400)
+        tokenizer.train("hello world this is a test hello world test")
+        texts = ["hello world", "this is a test", "hello test"] * 4
+        
+        async def run():
+            server = TokenizerServer(tokenizer, max_batch_size=8, max_latency_ms=20)
+            address = await server.start()
+            client = TokenizerClient()
+            await client.connect(address)
+            try:
+                encoded = await asyncio.gather(*[client.encode(text) for text in texts])
+                decoded = await client.decode(encoded[0])
+                try:
+                    await client.decode("not token ids")
+                    failed = False
+                except RuntimeError:
+                    failed = True
+                metrics = await client.metrics()
+            finally:
+                await client.close()
+                await server.close()
+            return encoded, decoded, failed, metrics
+        
+        encoded, decoded, failed, metrics = asyncio.run(run())
+        
+        assert encoded == [tokenizer.encode(text) for text in texts]
+        assert decoded == texts[0]
+        assert failed
+        
+        # 12 concurrent requests with room for 8 per batch
+        assert metrics['requests_total'] == len(texts) + 2
+        assert metrics['mean_batch_size'] > 1
+        
+        # Long lines: a large text is served, an oversized request or
+        # response fails alone and the connection keeps working
+        large_text = 'hello world ' * 10000
+        
+        async def run_large():
+            server = TokenizerServer(tokenizer, max_line_bytes=64 << 10)
+            address = await server.start()
+            client = TokenizerClient(max_line_bytes=64 << 10)
+            await client.connect(address)
+            results = []
+            try:
+                for text in (large_text, 'zq' * 15000, 'hello world'):
+                    try:
+                        results.append(await client.encode(text))
+                    except RuntimeError as e:
+                        results.append(str(e))
+            finally:
+                await client.close()
+                await server.close()
+            
+            server = TokenizerServer(tokenizer)
+            address = await server.start()
+            client = TokenizerClient()
+            await client.connect(address)
+            try:
+                results.append(await client.encode(large_text))
+            finally:
+                await client.close()
+                await server.close()
+            return results
+        
+        too_long_request, too_long_response, small, large = asyncio.run(run_large())
+        assert 'exceeds the limit' in too_long_request
+        assert 'exceeds the limit' in too_long_response
+        assert small == tokenizer.encode('hello world')
+        assert large == tokenizer.encode(large_text)
+        
+        try:
+            asyncio.run(TokenizerServer(tokenizer).start(host='0.0.0.0'))
+            assert False, "non-loopback hosts should be rejected"
+        except ValueError:
+            pass
+        
+        print(f"   Batches: {metrics['batches_total']}, mean size: {metrics['mean_batch_size']:.1f}")
+        print("   ✅ Tokenizer server working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Tokenizer server failed: {e}")
+        return False
+
+
+def test_vocabulary_pruning():
+    """Test min-frequency training and retrain-free vocabulary pruning."""
+    print("✂️ Testing Vocabulary Pruning...")
+    
+    try:
+        import numpy as np
+        from tokenization import BPETokenizer, remap_embeddings
+        
+        text = "hello world this is a test hello world test the quick brown fox"
+        
+        # Pairs seen only once are not merged
+        frequent = BPETokenizer(vocab_size=400, min_pair_frequency=2)
+        frequent.train(text)
+        full = BPETokenizer(vocab_size=400)
+        full.train(text)
+        assert len(frequent.merges) < len(full.merges)
+        assert frequent.merges == full.merges[:len(frequent.merges)]
+        
+        old_vocab = dict(full.vocab)
+        old_ids = full.encode("hello world")
+        counts = full.count_tokens(["hello world", "hello test"])
+        remap = full.prune(counts, target_size=len(full.vocab) - 10)
+        
+        assert len(full.vocab) == len(old_vocab) - 10
+        assert sorted(full.vocab) == list(range(len(full.vocab)))
+        assert all(full.vocab[new_id] == old_vocab[old_id] for old_id, new_id in remap.items())
+        assert full.decode(full.encode("the quick brown fox")) == "the quick brown fox"
+        
+        # Used tokens survive, so counted texts encode the same (renumbered)
+        assert full.encode("hello world") == [remap[token_id] for token_id in old_ids]
+        
+        embeddings = np.arange(len(old_vocab), dtype=np.float32)[:, None]
+        pruned = remap_embeddings(embeddings, remap)
+        assert pruned.shape == (len(full.vocab), 1)
+        assert pruned[remap[max(remap)], 0] == max(remap)
+        
+        print(f"   Merges with min frequency 2: {len(frequent.merges)}, pruned vocabulary: {len(full.vocab)}")
+        print("   ✅ Vocabulary pruning working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Vocabulary pruning failed: {e}")
+        return False
+
+
+def test_training_progress():
+    """Test training progress events and silent mode."""
+    print("📈 Testing Training Progress...")
+    
+    try:
+        import io
+        import contextlib
+        from tokenization import BPETokenizer, create_dynamic_tokenizer
+        
+        text = "hello world this is a test hello world test"
+        events = []
+        output = io.StringIO()
+        
+        tokenizer = BPETokenizer(vocab_size=300, verbose=False)
+        with contextlib.redirect_stdout(output):
+            tokenizer.train(text, progress_callback=events.append)
+        
+        # The factories used per request are silent as well
+        with contextlib.redirect_stdout(output):
+            for incremental in (False, True):
+                create_dynamic_tokenizer("silent factory prompt", vocab_size=300,
+                                         incremental=incremental, verbose=False)
+        
+        assert output.getvalue() == ""
+        assert events[0]['event'] == 'counted'
+        assert events[-1]['event'] == 'done'
+        
+        merge_events = [event for event in events if event['event'] == 'merge']
+        assert [event['pair'] for event in merge_events] == tokenizer.merges
+        assert all(event['words_touched'] > 0 for event in merge_events)
+        assert merge_events[0]['pair_frequency'] >= merge_events[-1]['pair_frequency']
+        
+        stats = tokenizer.training_stats
+        assert stats['num_merges'] == len(tokenizer.merges)
+        assert stats['selection_sec'] >= 0 and stats['merging_sec'] > 0
+        
+        print(f"   {stats['num_merges']} merges at {stats['merges_per_sec']:.0f} merges/sec")
+        print("   ✅ Training progress working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Training progress failed: {e}")
+        return False
+
+
+def test_shared_tokenizer_tables():
+    """Test publishing tokenizer tables and attaching read-only views."""
+    print("🤝 Testing Shared Tokenizer Tables...")
+    
+    try:
+        import pickle
+        from tokenization import BPETokenizer
+        
+        tokenizer = BPETokenizer(vocab_size=400, verbose=False)
+        tokenizer.train("hello world this is a test hello world test")
+        
+        path = tokenizer.publish_shared()
+        try:
+            attached = BPETokenizer.attach_shared(path)
+            
+            # Views into the shared file, not private dictionaries
+            assert not isinstance(attached.vocab, dict)
+            assert attached.vocab == tokenizer.vocab
+            assert attached.token_to_id == tokenizer.token_to_id
+            assert list(attached.merges) == tokenizer.merges
+            
+            text = "hello wörld, this is a test"
+            assert attached.encode(text) == tokenizer.encode(text)
+            assert attached.decode(attached.encode(text)) == text
+            assert attached.decode(attached.iter_encode(text)) == text
+            
+            # Decoding and visualizing read the token bytes from the buffer
+            batch = tokenizer.encode_to_array([text, "this is", ""], max_len=32)[0]
+            assert attached.decode_batch(batch) == tokenizer.decode_batch(batch)
+            assert attached.decode([5, -1, 10 ** 6, 2]) == tokenizer.decode([5, -1, 10 ** 6, 2])
+            assert attached._get_decode_tables()[0] is None
+            assert (attached.visualize_tokenization(text).token_texts ==
+                    tokenizer.visualize_tokenization(text).token_texts)
+            
+            # Pickling (e.g. for worker pools) and modifying make private copies
+            copied = pickle.loads(pickle.dumps(attached))
+            assert isinstance(copied.vocab, dict)
+            attached.adapt("zebra zebra zebra")
+            assert isinstance(attached.vocab, dict)
+        finally:
+            os.remove(path)
+        
+        print(f"   Published {len(tokenizer.vocab)} tokens to {path}")
+        print("   ✅ Shared tokenizer tables working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Shared tokenizer tables failed: {e}")
+        return False
+
+
+def test_pre_tokenizer():
+    """Test the pluggable pre-tokenizer shared by training and encoding."""
+    print("✂️ Testing Pre-Tokenizer...")
+    
+    try:
+        import re
+        from collections import Counter
+        from tokenization import BPETokenizer, PreTokenizer
+        
+        text = "Hello World, hello world!\nThe TEST is a test.  " * 50
+        
+        # Chunked counting matches counting the whole lowercased text
+        pre_tokenizer = PreTokenizer(r'\b\w+\b', case='lower', chunk_chars=64)
+        assert pre_tokenizer.count_words(text) == Counter(re.findall(r'\b\w+\b', text.lower()))
+        assert list(pre_tokenizer.iter_words(text)) == pre_tokenizer.split(text)
+        
+        # The default pre-tokenizer is lossless
+        tokenizer = BPETokenizer(vocab_size=300, verbose=False)
+        tokenizer.train(text)
+        assert tokenizer.decode(tokenizer.encode(text)) == text
+        
+        # Training and encoding share the case-folding policy
+        folding = BPETokenizer(vocab_size=300, verbose=False,
+                               pre_tokenizer=PreTokenizer(case='lower'))
+        folding.train(text)
+        assert all(left + right == (left + right).lower() for left, right in folding.merges)
+        assert folding.encode("Hello TEST") == folding.encode("hello test")
+        assert list(folding.iter_encode("Hello TEST")) == folding.encode("hello test")
+        
+        token_ids, offsets = folding.encode("Hello TEST", return_offsets=True)
+        assert len(offsets) == len(token_ids) and offsets[-1] == (10, 10)
+        
+        # The pre-tokenizer is saved with the tokenizer
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'folding.bin')
+            folding.save(path)
+            loaded = BPETokenizer.load(path, mmap=False)
+        assert loaded.pre_tokenizer.to_dict() == folding.pre_tokenizer.to_dict()
+        assert loaded.encode("HELLO World") == folding.encode("HELLO World")
+        
+        shared_path = folding.publish_shared()
+        try:
+            attached = BPETokenizer.attach_shared(shared_path)
+            assert attached.encode("HELLO World") == folding.encode("HELLO World")
+            del attached
+        finally:
+            os.remove(shared_path)
+        
+        try:
+            PreTokenizer(r'(\w+)')
+            assert False, "capturing groups should be rejected"
+        except ValueError:
+            pass
+        
+        print(f"   {pre_tokenizer}")
+        print("   ✅ Pre-tokenizer working!")
+        
+        return True
+        
+    except Exception as e:
+        print(f"   ❌ Pre-tokenizer failed: {e}")
+        return False
+
+
 def test_basic_functionality():
     """Test basic functionality without PyTorch dependencies."""
     print("🧪 Testing Basic Functionality...")
@@ -138,6 +1117,30 @@ def main():
     tests = [
         test_basic_functionality,
         test_tokenization,
+        test_incremental_bpe_training,
+        test_rank_based_encoding,
+        test_word_cache,
+        test_batch_encoding,
+        test_streaming_training,
+        test_parallel_word_counting,
+        test_tokenizer_serialization,
+        test_cached_sample_tokenizer,
+        test_incremental_adaptation,
+        test_byte_level_roundtrip,
+        test_longest_match_mode,
+        test_encode_to_array,
+        test_encode_offsets,
+        test_columnar_visualization,
+        test_token_dataset,
+        test_sequence_packing,
+        test_benchmark_suite,
+        test_streaming_encode,
+        test_batch_decoding,
+        test_tokenizer_server,
+        test_vocabulary_pruning,
+        test_training_progress,
+        test_shared_tokenizer_tables,
+        test_pre_tokenizer,
         test_utils,
         test_pytorch_components
     ]